@@ -0,0 +1,8 @@
+"""Benchmarks of ignition, run as modules from the repository root, e.g. python -m benchmarks.suite.
+
+    spawn     spawn latency with preexec_fn and native Popen arguments
+    output    throughput of program output handling
+    generate  synthetic launch files with dependency chains and fan-outs
+    suite     startup, output throughput, restart and shutdown latency, written as JSON
+    docker    Docker plugin against a stand-in docker executable, standin is the executable
+"""
@@ -0,0 +1,40 @@
+"""Dummy program for benchmarks. Prints a readiness line, then writes lines at a given rate and
+optionally exits with an error code after a given time to simulate a crash."""
+
+import argparse
+import sys
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dummy program")
+    parser.add_argument("--rate", type=float, default=0, help="Lines per second, 0 writes nothing")
+    parser.add_argument("--length", type=int, default=80, help="Line length in bytes including newline")
+    parser.add_argument("--crash", type=float, default=None, help="Exit with an error after this many seconds")
+    parser.add_argument("--code", type=int, default=1, help="Exit code of a crash")
+    args = parser.parse_args()
+
+    stdout = sys.stdout.buffer
+    stdout.write(b"ready\n")
+    stdout.flush()
+
+    line = b"x" * max(0, args.length - 1) + b"\n"
+    start = time.monotonic()
+    written = 0
+    while True:
+        now = time.monotonic()
+        if args.crash is not None and now - start >= args.crash:
+            sys.exit(args.code)
+        if args.rate > 0:
+            # Lines are written in batches so that high rates do not need a system call per line
+            due = int((now - start) * args.rate) - written
+            if due > 0:
+                stdout.write(line * due)
+                stdout.flush()
+                written += due
+        delay = 0.01 if args.rate > 0 else 1
+        if args.crash is not None:
+            delay = min(delay, max(0, args.crash - (now - start)))
+        time.sleep(delay)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Check of the Docker plugin against the stand-in docker executable, no Docker daemon is needed.
+
+Run from the repository root::
+
+    $ python -m benchmarks.docker
+
+Runs ignite with a launch file of programs in containers and checks the calls that the plugin made:
+every image is pulled once, every container is created with its volumes and environment and
+attached with start -a, and all containers are removed when the group stops, including the
+container of a program that was never started because its dependency did not become ready.
+Startup and shutdown times are printed, the exit code is 1 if a check fails.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from benchmarks.generate import child_command
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STANDIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "standin.py")
+
+def launch_file():
+    """Returns a launch file with programs in containers, program broken never becomes ready so that
+    program late is never started."""
+    ready = dict(output="^ready$")
+    return dict(title="Docker", environment={}, plugins=["docker"], programs=dict(
+        db=dict(command=child_command(), ready=ready, environment=dict(ROLE="db"),
+            docker=dict(image="standin/db", volumes=["/tmp:/data"])),
+        web=dict(command=child_command(), ready=ready, depends=["db"], docker=dict(image="standin/web")),
+        worker=dict(command=child_command(), ready=ready, depends=["db"], docker=dict(image="standin/web")),
+        broken=dict(command=child_command(), ready=dict(output="^never$", timeout=1),
+            docker=dict(image="standin/db")),
+        late=dict(command=child_command(), ready=ready, depends=["broken"], docker=dict(image="standin/web")),
+    ))
+
+def standin(directory):
+    """Writes an executable that runs the stand-in with its state in a directory, returns its path."""
+    state = os.path.join(directory, "state")
+    path = os.path.join(directory, "docker")
+    with open(path, "w") as handle:
+        handle.write("#!/bin/sh\nSTANDIN_DOCKER_STATE=%s exec %s %s \"$@\"\n" % (shlex.quote(state),
+            shlex.quote(sys.executable), shlex.quote(STANDIN)))
+    os.chmod(path, 0o755)
+    return path, state
+
+def run(timeout=60):
+    """Runs ignite until the group has started, stops it and returns calls made to the stand-in,
+    containers left in its state, startup and shutdown time."""
+    with tempfile.TemporaryDirectory() as directory:
+        executable, state = standin(directory)
+        source = os.path.join(directory, "launch.yaml")
+        with open(source, "w") as handle:
+            yaml.safe_dump(launch_file(), handle, sort_keys=False)
+        environment = dict(os.environ, IGNITION_CACHE="", IGNITION_DOCKER=executable)
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-m", "ignition", source], cwd=ROOT, env=environment,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        try:
+            ready, held = 0, False
+            for line in process.stdout:
+                if b"Ready after" in line:
+                    ready += 1
+                elif b"Not starting late" in line:
+                    held = True
+                if (ready == 3 and held) or time.perf_counter() - start > timeout:
+                    break
+            startup = time.perf_counter() - start
+            start = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            process.stdout.read()
+            process.wait(timeout)
+            shutdown = time.perf_counter() - start
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        with open(os.path.join(state, "calls")) as handle:
+            calls = [json.loads(line)["arguments"] for line in handle]
+        left = os.listdir(os.path.join(state, "containers"))
+    return calls, left, startup, shutdown
+
+def check(calls, left):
+    """Returns a list of problems found in calls made by the plugin."""
+    problems = []
+    for image in ("standin/db", "standin/web"):
+        pulls = calls.count(["pull", image])
+        if pulls != 1:
+            problems.append("image %s pulled %d times" % (image, pulls))
+
+    containers = {}
+    for arguments in calls:
+        if arguments[0] == "create":
+            name = arguments[arguments.index("--name") + 1]
+            containers[name.split("-")[1]] = (name, arguments)
+    for program in ("db", "web", "worker", "broken", "late"):
+        if program not in containers:
+            problems.append("no container created for %s" % program)
+    if "db" in containers:
+        _, arguments = containers["db"]
+        if "ROLE=db" not in arguments or "/tmp:/data" not in arguments:
+            problems.append("container of db created without its environment or volume: %s" % " ".join(arguments))
+
+    for program, (name, _) in sorted(containers.items()):
+        started = ["start", "-a", name] in calls
+        if started != (program != "late"):
+            problems.append("container of %s %s" % (program, "started" if started else "not started"))
+        if ["rm", "-f", name] not in calls:
+            problems.append("container of %s not removed" % program)
+    if left:
+        problems.append("containers left behind: %s" % ", ".join(sorted(left)))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the Docker plugin against a stand-in docker executable")
+    parser.add_argument("--timeout", type=float, default=60, help="Maximum time in seconds for startup and shutdown")
+    args = parser.parse_args()
+
+    calls, left, startup, shutdown = run(args.timeout)
+    print("Startup %.1f ms, shutdown %.1f ms, %d docker calls" % (startup * 1000, shutdown * 1000, len(calls)))
+    problems = check(calls, left)
+    for problem in problems:
+        print("Failed: %s" % problem)
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Generator of synthetic launch files for benchmarks.
+
+Run from the repository root::
+
+    $ python -m benchmarks.generate --programs 30 --depth 3 --width 2 --rate 100 > launch.yaml
+
+Programs are arranged in trees of the given depth where every program has width dependents, a
+width of 1 gives dependency chains and a depth of 1 independent programs. Every program is a
+dummy child that reports readiness on its output, writes lines at a given rate and can crash
+after a given time.
+"""
+
+import argparse
+import os
+import shlex
+import sys
+
+import yaml
+
+CHILD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "child.py")
+
+def child_command(rate=0, length=80, crash=None, code=1):
+    arguments = [sys.executable, CHILD, "--rate", str(rate), "--length", str(length)]
+    if crash is not None:
+        arguments.extend(["--crash", str(crash), "--code", str(code)])
+    return " ".join(shlex.quote(x) for x in arguments)
+
+def topology(programs, depth=1, width=1):
+    """Returns a dictionary that maps program names to lists of their dependencies."""
+    size = sum(width ** level for level in range(max(depth, 1)))
+    names = ["p%04d" % i for i in range(programs)]
+    graph = {}
+    for i, name in enumerate(names):
+        tree, index = divmod(i, size)
+        # Programs of a tree are numbered in breadth-first order
+        graph[name] = [names[tree * size + (index - 1) // width]] if index > 0 else []
+    return graph
+
+def generate(programs=10, depth=1, width=1, rate=0, length=80, crash=None, parallel=True, console=False, logs=None):
+    """Returns a launch file as a dictionary. Logs are written to a directory if one is given."""
+    result = dict(title="Benchmark", environment={}, parallel=parallel, programs={})
+    for name, depends in topology(programs, depth, width).items():
+        program = dict(command=child_command(rate, length, crash), depends=depends, ready=dict(output="^ready$"))
+        if console:
+            program["console"] = "true"
+        if logs is not None:
+            program["log"] = os.path.join(logs, name + ".log")
+        if crash is not None:
+            program["restart"] = dict(delay=0, jitter=0)
+        result["programs"][name] = program
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic launch file")
+    parser.add_argument("--programs", type=int, default=10, help="Number of programs")
+    parser.add_argument("--depth", type=int, default=1, help="Depth of dependency trees")
+    parser.add_argument("--width", type=int, default=1, help="Number of dependents of every program")
+    parser.add_argument("--rate", type=float, default=0, help="Output lines per second of every program")
+    parser.add_argument("--length", type=int, default=80, help="Output line length in bytes")
+    parser.add_argument("--crash", type=float, default=None, help="Programs crash after this many seconds")
+    parser.add_argument("--serial", action="store_true", help="Start programs one after another")
+    parser.add_argument("--console", action="store_true", help="Show output of programs on the console")
+    parser.add_argument("--logs", default=None, help="Directory for program logs")
+    args = parser.parse_args()
+
+    data = generate(args.programs, args.depth, args.width, args.rate, args.length, args.crash,
+        not args.serial, args.console, args.logs)
+    yaml.safe_dump(data, sys.stdout, sort_keys=False)
+
+if __name__ == "__main__":
+    main()
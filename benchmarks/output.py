@@ -0,0 +1,85 @@
+"""Output reader stress benchmark, measures throughput of program output handling in MB/s.
+
+Run from the repository root::
+
+    $ python -m benchmarks.output --size 64
+
+Three kinds of output are measured: many small lines, large lines and output without any
+newlines. Each is measured for the line splitter alone and end to end, with a child process
+writing to a program handler that relays output to a log file and to the console (the console
+stream is redirected to /dev/null).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from ignition.output import LineBuffer, OutputWriter
+from ignition import output as _output
+from ignition.program import ProgramHandler
+
+PROFILES = {
+    "small": 40,
+    "large": 16384,
+    "newline-free": 0,
+}
+
+def _payload(length, size):
+    if length == 0:
+        block = b"x" * 65536
+    else:
+        block = (b"y" * (length - 1) + b"\n") * max(1, 65536 // length)
+    return block, max(1, size // len(block))
+
+def measure_splitter(length, size, limit):
+    block, count = _payload(length, size)
+    buffer = LineBuffer(limit)
+    start = time.perf_counter()
+    for _ in range(count):
+        buffer.feed(block)
+    buffer.flush()
+    elapsed = time.perf_counter() - start
+    return len(block) * count / elapsed / 1e6
+
+_GENERATOR = "import sys; block = {block!r}; [sys.stdout.buffer.write(block) for _ in range({count})]"
+
+def measure_handler(length, size, limit, console, log):
+    block, count = _payload(length, size)
+    command = "%s -c \"%s\"" % (sys.executable, _GENERATOR.format(block=block, count=count))
+    with tempfile.TemporaryDirectory() as directory:
+        arguments = dict(command=command, environment={}, maxline=limit, direct=False)
+        if console:
+            arguments["console"] = "true"
+        if log:
+            arguments["log"] = os.path.join(directory, "output.log")
+        handler = ProgramHandler(_identifier="benchmark", **arguments)
+        start = time.perf_counter()
+        handler.start()
+        handler._finished.wait()
+        _output.output_writer().flush()
+        elapsed = time.perf_counter() - start
+    return len(block) * count / elapsed / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Output reader throughput")
+    parser.add_argument("--size", type=int, default=64, help="Amount of output per measurement in MB")
+    parser.add_argument("--limit", type=int, default=65536, help="Maximum line length")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+
+    # Console output goes to /dev/null so that the terminal speed is not measured
+    _output._writer = OutputWriter(stream=open(os.devnull, "w"))
+
+    print("%-14s %12s %12s %12s %12s" % ("profile", "split [MB/s]", "log [MB/s]", "console [MB/s]", "both [MB/s]"))
+    for name, length in PROFILES.items():
+        splitter = measure_splitter(length, size, args.limit)
+        logged = measure_handler(length, size, args.limit, False, True)
+        console = measure_handler(length, size, args.limit, True, False)
+        both = measure_handler(length, size, args.limit, True, True)
+        print("%-14s %12.1f %12.1f %12.1f %12.1f" % (name, splitter, logged, console, both))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Spawn latency micro-benchmark, compares the preexec_fn path with native Popen arguments.
+
+Run from the repository root::
+
+    $ python -m benchmarks.spawn --workers 32 --restarts 50 --ballast 512
+
+Each worker thread repeatedly spawns and reaps a trivial program, simulating many programs
+being restarted at the same time. Ballast memory is allocated in the supervisor to show the
+cost of copying page tables on fork.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from ignition.program import spawn_arguments
+
+def _worker(command, arguments, restarts, latencies, barrier):
+    barrier.wait()
+    for _ in range(restarts):
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, **arguments)
+        latencies.append(time.perf_counter() - start)
+        process.wait()
+
+def measure(native, workers, restarts, command):
+    arguments = spawn_arguments(None, None, [], native=native)
+    latencies = []
+    barrier = threading.Barrier(workers)
+    threads = [threading.Thread(target=_worker, args=(command, arguments, restarts, latencies, barrier)) for _ in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+    latencies.sort()
+    return dict(
+        spawns=len(latencies),
+        total=total,
+        mean=statistics.mean(latencies),
+        median=latencies[len(latencies) // 2],
+        p99=latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Spawn latency under concurrent restarts")
+    parser.add_argument("--workers", type=int, default=16, help="Number of concurrently restarting programs")
+    parser.add_argument("--restarts", type=int, default=50, help="Number of spawns per worker")
+    parser.add_argument("--ballast", type=int, default=256, help="Supervisor memory in MB touched before spawning")
+    parser.add_argument("--command", default="true", help="Command that is spawned")
+    args = parser.parse_args()
+
+    ballast = bytearray(args.ballast * 1024 * 1024)
+    for i in range(0, len(ballast), 4096):
+        ballast[i] = 1
+
+    modes = [("preexec_fn", False)]
+    if sys.version_info >= (3, 11):
+        modes.append(("native", True))
+
+    print("%-12s %8s %10s %10s %10s %10s" % ("mode", "spawns", "total [s]", "mean [ms]", "median [ms]", "p99 [ms]"))
+    for name, native in modes:
+        result = measure(native, args.workers, args.restarts, [args.command])
+        print("%-12s %8d %10.3f %10.3f %10.3f %10.3f" % (name, result["spawns"], result["total"],
+            result["mean"] * 1000, result["median"] * 1000, result["p99"] * 1000))
+
+if __name__ == "__main__":
+    main()
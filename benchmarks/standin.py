@@ -0,0 +1,92 @@
+"""Stand-in for the docker executable that the Docker plugin can be run against without a Docker
+daemon. Supports the subset of commands that the plugin uses: image inspect, pull, create, start -a
+and rm -f. Images and containers are files in a state directory set with STANDIN_DOCKER_STATE, every
+invocation is appended to a calls file there as a JSON line. A started container runs its command
+as a local process in place of the client, so it receives signals like an attached container.
+"""
+
+import json
+import os
+import sys
+import time
+
+def _path(state, kind, name):
+    return os.path.join(state, kind, name.replace("/", "_").replace(":", "_"))
+
+def _fail(message):
+    print("Error: %s" % message, file=sys.stderr)
+    return 1
+
+def _create(state, arguments):
+    name, environment, volumes, devices = None, {}, [], []
+    while arguments and arguments[0].startswith("-"):
+        option = arguments.pop(0)
+        if option == "--name":
+            name = arguments.pop(0)
+        elif option == "--env":
+            key, _, value = arguments.pop(0).partition("=")
+            environment[key] = value
+        elif option == "-v":
+            volumes.append(arguments.pop(0))
+        elif option == "--device":
+            devices.append(arguments.pop(0))
+        elif option != "-t":
+            return _fail("unknown option %s" % option)
+    if name is None or not arguments:
+        return _fail("container name and image required")
+    image, command = arguments[0], arguments[1:]
+    if not os.path.exists(_path(state, "images", image)):
+        return _fail("No such image: %s" % image)
+    path = _path(state, "containers", name)
+    if os.path.exists(path):
+        return _fail("Conflict. The container name %s is already in use" % name)
+    with open(path, "w") as handle:
+        json.dump(dict(image=image, command=command, environment=environment, volumes=volumes,
+            devices=devices), handle)
+    print(name)
+    return 0
+
+def _start(state, arguments):
+    if len(arguments) != 2 or arguments[0] != "-a":
+        return _fail("only start -a is supported")
+    try:
+        with open(_path(state, "containers", arguments[1])) as handle:
+            container = json.load(handle)
+    except OSError:
+        return _fail("No such container: %s" % arguments[1])
+    if not container["command"]:
+        return _fail("container %s has no command" % arguments[1])
+    os.execvpe(container["command"][0], container["command"], dict(os.environ, **container["environment"]))
+
+def main(arguments):
+    state = os.environ.get("STANDIN_DOCKER_STATE")
+    if state is None:
+        return _fail("STANDIN_DOCKER_STATE not set")
+    os.makedirs(os.path.join(state, "images"), exist_ok=True)
+    os.makedirs(os.path.join(state, "containers"), exist_ok=True)
+    with open(os.path.join(state, "calls"), "a") as handle:
+        handle.write(json.dumps(dict(time=time.time(), arguments=arguments)) + "\n")
+
+    if arguments[:2] == ["image", "inspect"] and len(arguments) == 3:
+        if not os.path.exists(_path(state, "images", arguments[2])):
+            return _fail("No such image: %s" % arguments[2])
+        return 0
+    if arguments[:1] == ["pull"] and len(arguments) == 2:
+        # Pulling takes a while, concurrent pulls of the same image would show up as overlapping calls
+        time.sleep(float(os.environ.get("STANDIN_DOCKER_PULL", 0.2)))
+        open(_path(state, "images", arguments[1]), "w").close()
+        return 0
+    if arguments[:1] == ["create"]:
+        return _create(state, arguments[1:])
+    if arguments[:1] == ["start"]:
+        return _start(state, arguments[1:])
+    if arguments[:2] == ["rm", "-f"] and len(arguments) == 3:
+        try:
+            os.unlink(_path(state, "containers", arguments[2]))
+        except OSError:
+            return _fail("No such container: %s" % arguments[2])
+        return 0
+    return _fail("unsupported command %s" % " ".join(arguments))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
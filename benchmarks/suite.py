@@ -0,0 +1,186 @@
+"""Benchmark suite for startup, output throughput, restart and shutdown latency.
+
+Run from the repository root::
+
+    $ python -m benchmarks.suite --programs 50 --depth 3 --width 2 --output results.json
+
+Startup is measured from invocation of ignite until all programs of a generated launch file are
+ready, with a cold and a warm launch cache, shutdown as the time from SIGTERM until ignite exits.
+Output throughput is measured through the output path of a program handler with console and log
+on and off. Restart turnaround is the time between the end of an attempt and the start of the next
+one, taken from lifecycle trace events. Stop is the duration of ProgramGroup.stop. Results are
+written as JSON so that they can be compared across versions.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from ignition import output as _output
+from ignition.output import OutputWriter
+from ignition.program import ProgramGroup, ProgramHandler
+from ignition.trace import tracer
+
+from benchmarks.generate import child_command, generate
+from benchmarks.output import PROFILES, measure_handler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def summary(values):
+    values = sorted(values)
+    if not values:
+        return dict(count=0)
+    return dict(
+        count=len(values),
+        mean=sum(values) / len(values),
+        median=values[len(values) // 2],
+        min=values[0],
+        max=values[-1],
+        p99=values[min(len(values) - 1, int(len(values) * 0.99))],
+    )
+
+def _version():
+    try:
+        from importlib.metadata import version
+        package = version("ignition")
+    except Exception:
+        package = None
+    try:
+        commit = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return package, commit
+
+def measure_startup(programs, depth, width, repeat, timeout=120):
+    """Runs ignite repeatedly with a generated launch file, the first run has a cold launch cache."""
+    startup, shutdown = [], []
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "launch.yaml")
+        with open(source, "w") as handle:
+            yaml.safe_dump(generate(programs, depth, width), handle, sort_keys=False)
+        environment = dict(os.environ, IGNITION_CACHE=os.path.join(directory, "cache"))
+        for _ in range(repeat):
+            start = time.perf_counter()
+            process = subprocess.Popen([sys.executable, "-m", "ignition", source], cwd=ROOT, env=environment,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            ready = 0
+            try:
+                for line in process.stdout:
+                    if b"Ready after" in line:
+                        ready += 1
+                        if ready == programs:
+                            break
+                    if time.perf_counter() - start > timeout:
+                        break
+                if ready < programs:
+                    raise RuntimeError("Only %d of %d programs became ready" % (ready, programs))
+                startup.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                process.send_signal(signal.SIGTERM)
+                # Output has to be consumed, ignite would otherwise block on a full pipe
+                process.stdout.read()
+                process.wait(timeout)
+                shutdown.append(time.perf_counter() - start)
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+    return dict(programs=programs, depth=depth, width=width, cold=startup[0], warm=summary(startup[1:]),
+        shutdown=summary(shutdown))
+
+def measure_throughput(size, limit):
+    """Measures output throughput of a program handler for all combinations of console and log."""
+    results = []
+    for name, length in PROFILES.items():
+        for console in (False, True):
+            for log in (False, True):
+                rate = measure_handler(length, size, limit, console, log)
+                results.append(dict(profile=name, console=console, log=log, megabytes=rate,
+                    lines=rate * 1e6 / length if length > 0 else 0))
+    return results
+
+def measure_restart(restarts):
+    """Measures the time between the end of an attempt of a crashing program and its next attempt."""
+    identifier = "restart-benchmark"
+    handler = ProgramHandler(_identifier=identifier, command=child_command(crash=0), environment={},
+        restart=dict(delay=0, jitter=0, attempts=restarts + 1, reset=3600))
+    handler.start()
+    handler._finished.wait()
+    turnaround, cycle = [], []
+    exited, spawned = None, None
+    for event in tracer().events():
+        if event["program"] != identifier:
+            continue
+        if event["name"] == "exit":
+            exited = event["ts"]
+        elif event["name"] == "spawn":
+            if exited is not None:
+                turnaround.append(event["ts"] - exited)
+            if spawned is not None:
+                cycle.append(event["ts"] - spawned)
+            spawned = event["ts"]
+    return dict(restarts=len(turnaround), turnaround=summary(turnaround), cycle=summary(cycle))
+
+def measure_stop(programs, depth, width, repeat):
+    """Measures the duration of ProgramGroup.stop for a started generated group."""
+    durations = []
+    for _ in range(repeat):
+        group = ProgramGroup(**generate(programs, depth, width))
+        group.start()
+        start = time.perf_counter()
+        group.stop()
+        durations.append(time.perf_counter() - start)
+    return dict(programs=programs, depth=depth, width=width, stop=summary(durations))
+
+BENCHMARKS = ("startup", "throughput", "restart", "stop")
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup, output throughput, restart and shutdown benchmarks")
+    parser.add_argument("--programs", type=int, default=20, help="Number of programs of generated launch files")
+    parser.add_argument("--depth", type=int, default=3, help="Depth of dependency trees")
+    parser.add_argument("--width", type=int, default=2, help="Number of dependents of every program")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs of startup and stop benchmarks")
+    parser.add_argument("--size", type=int, default=16, help="Amount of output per throughput measurement in MB")
+    parser.add_argument("--limit", type=int, default=65536, help="Maximum line length")
+    parser.add_argument("--restarts", type=int, default=20, help="Number of restarts of the restart benchmark")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS, help="Run only selected benchmarks")
+    parser.add_argument("--output", default=None, help="File that results are written to as JSON, standard output if omitted")
+    args = parser.parse_args()
+
+    # Console output goes to /dev/null so that the terminal speed is not measured
+    _output._writer = OutputWriter(stream=open(os.devnull, "w"))
+
+    selected = args.only or BENCHMARKS
+    results = {}
+    if "startup" in selected:
+        results["startup"] = measure_startup(args.programs, args.depth, args.width, max(args.repeat, 2))
+    if "throughput" in selected:
+        results["throughput"] = measure_throughput(args.size * 1024 * 1024, args.limit)
+    if "restart" in selected:
+        results["restart"] = measure_restart(args.restarts)
+    if "stop" in selected:
+        results["stop"] = measure_stop(args.programs, args.depth, args.width, args.repeat)
+
+    package, commit = _version()
+    report = dict(version=package, commit=commit, python=platform.python_version(), platform=platform.platform(),
+        time=datetime.datetime.now().isoformat(), parameters=vars(args), results=results)
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+if __name__ == "__main__":
+    main()
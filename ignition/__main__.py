@@ -1,7 +1,16 @@
-import sys, time
+import os
+import sys
 import signal
 
-from ignition.program import ProgramGroup
+from ignition.timings import timings
+from ignition.trace import tracer
+
+# Trace timestamps are relative to creation of the tracer
+tracer()
+
+with timings().measure("import"):
+    from ignition.output import output_writer, WHITE
+    from ignition.program import ProgramGroup
 
 class shutdown_handler:
     
@@ -11,26 +20,94 @@ class shutdown_handler:
     def __call__(self, signum, frame):
         self.triggered = True
 
+class signal_flag:
+
+    def __init__(self, group):
+        self.group = group
+        self.triggered = False
+
+    def __call__(self, signum, frame):
+        self.triggered = True
+        self.group._changed.set()
+
+def _modified(sources):
+    modified = {}
+    for source in sources:
+        try:
+            modified[source] = os.stat(source).st_mtime_ns
+        except OSError:
+            modified[source] = None
+    return modified
+
+def reload(group, source):
+    try:
+        update = ProgramGroup.read(source)
+    except Exception as e:
+        # Syntax errors, half written or vanished files must not bring down running programs
+        group.announce("Error reloading launch file %s, keeping current programs: %s" % (source, e))
+        return
+    stopped, started = group.reload(update)
+    group.announce("Reloaded %s, stopped: %s, started: %s" % (source,
+        ", ".join(stopped) or "none", ", ".join(started) or "none"))
+
 def main():
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "ctl":
+        from ignition.control import client
+        sys.exit(client(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "trace":
+        from ignition.trace import main as trace
+        sys.exit(trace(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "logs":
+        from ignition.logs import main as logs
+        sys.exit(logs(sys.argv[2:]))
+
+    arguments = [argument for argument in sys.argv[1:] if argument != "--timings"]
+    report = len(arguments) < len(sys.argv) - 1
+
+    if len(arguments) > 0:
+        source = arguments[0]
         try:
-            group = ProgramGroup.read(sys.argv[1])
+            group = ProgramGroup.read(source)
         except ValueError as e:
-            print("Error opening launch file %s: %s" % (sys.argv[1], e))
+            print("Error opening launch file %s: %s" % (source, e))
             sys.exit(1)
 
         stop = shutdown_handler()
 
         signal.signal(signal.SIGTERM, stop)
 
+        changed = signal_flag(group)
+        signal.signal(signal.SIGHUP, changed)
+        reopen = signal_flag(group)
+        signal.signal(signal.SIGUSR1, reopen)
+
         try:
             group.announce("Starting up ...")
             group.start()
 
-            time.sleep(1)
-            
+            if report:
+                group.announce("Startup timings:")
+                for line in timings().report():
+                    output_writer().message(line, WHITE)
+                statistics = group.plugin_statistics()
+                if statistics:
+                    group.announce("Plugin hooks:")
+                    output_writer().message("%-40s %10s %10s" % ("hook", "calls", "took [ms]"), WHITE)
+                    for (plugin, hook), (count, total) in sorted(statistics.items()):
+                        output_writer().message("%-40s %10d %10.1f" % ("%s.%s" % (plugin, hook), count, total * 1000), WHITE)
+
+            modified = _modified(group.sources)
             while group.valid() and not stop.triggered:
-                time.sleep(0.5)
+                group.wait(0.5)
+                if group.watch and not changed.triggered:
+                    changed.triggered = _modified(group.sources) != modified
+                if changed.triggered:
+                    changed.triggered = False
+                    reload(group, source)
+                    modified = _modified(group.sources)
+                if reopen.triggered:
+                    reopen.triggered = False
+                    group.reopen_logs()
 
         except KeyboardInterrupt:
             pass
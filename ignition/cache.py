@@ -0,0 +1,165 @@
+
+import os
+import sys
+import json
+import stat
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+_FORMAT = 2
+
+# Number of entries kept in the cache, least recently used entries are removed beyond that
+_CAPACITY = 256
+
+def cache_directory():
+    """Returns directory of the launch file cache, set with IGNITION_CACHE environment variable,
+    empty value disables caching."""
+    directory = os.environ.get("IGNITION_CACHE")
+    if directory is None:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        directory = os.path.join(base, "ignition")
+    return directory or None
+
+def _parse_yaml(content):
+    import yaml
+    # C parser is much faster when available, mappings stay ordered as with attributee loader
+    class OrderedLoader(getattr(yaml, "CLoader", yaml.Loader)):
+        pass
+    def construct_mapping(loader, node):
+        loader.flatten_mapping(node)
+        return OrderedDict(loader.construct_pairs(node))
+    OrderedLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_mapping)
+    return yaml.load(content, OrderedLoader)
+
+def _parse(source, content):
+    ext = os.path.splitext(source)[1].lower()
+    if ext in [".yml", ".yaml"]:
+        return _parse_yaml(content)
+    if ext in [".json"]:
+        return json.loads(content, object_pairs_hook=OrderedDict)
+    raise ValueError("Unknown file format")
+
+def _trusted(path):
+    """Returns True if a path belongs to the current user and cannot be written by anyone else. Cached
+    data decides which commands are run, so entries that others could have replaced are ignored."""
+    try:
+        status = os.stat(path)
+    except OSError:
+        return False
+    return status.st_uid == os.getuid() and not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+class LaunchCache(object):
+    """Cache of parsed launch files keyed on hash of their content, stored as JSON. An entry is only
+    stored once the group built from it was validated, so a hit never contains a file that failed to
+    load. Data that does not survive a round trip through JSON, e.g. YAML dates, is not cached. Only
+    a limited number of entries is kept, a hit marks an entry as recently used."""
+
+    def __init__(self, directory=None, capacity=_CAPACITY):
+        self._directory = directory
+        self._capacity = capacity
+
+    def _path(self, digest):
+        return os.path.join(self._directory, digest + ".json")
+
+    def load(self, source):
+        """Reads a launch file, returns parsed data, content digest and whether data came from cache."""
+        with open(source, "rb") as handle:
+            content = handle.read()
+        digest = hashlib.sha256(b"%d:%d.%d:%s:" % (_FORMAT, sys.version_info[0], sys.version_info[1],
+            os.path.splitext(source)[1].lower().encode("utf-8")) + content).hexdigest()
+        path = self._path(digest) if self._directory is not None else None
+        if path is not None and _trusted(self._directory) and _trusted(path):
+            try:
+                with open(path, "r") as handle:
+                    data = json.load(handle, object_pairs_hook=OrderedDict)
+                os.utime(path)
+                return data, digest, True
+            except (OSError, ValueError):
+                pass
+        return _parse(source, content), digest, False
+
+    def store(self, digest, data):
+        if self._directory is None:
+            return
+        try:
+            content = json.dumps(data)
+            if json.loads(content, object_pairs_hook=OrderedDict) != data:
+                return
+        except (TypeError, ValueError):
+            return
+        try:
+            os.makedirs(self._directory, mode=0o700, exist_ok=True)
+            handle, temporary = tempfile.mkstemp(dir=self._directory)
+        except OSError:
+            # Cache is only an optimization, startup continues without it
+            return
+        try:
+            with os.fdopen(handle, "w") as stream:
+                stream.write(content)
+            os.replace(temporary, self._path(digest))
+        except OSError:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            return
+        self._prune()
+
+    def _prune(self):
+        try:
+            entries = []
+            with os.scandir(self._directory) as iterator:
+                for entry in iterator:
+                    if entry.name.endswith(".json") and entry.is_file(follow_symlinks=False):
+                        entries.append((entry.stat(follow_symlinks=False).st_mtime, entry.path))
+        except OSError:
+            return
+        if len(entries) <= self._capacity:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self._capacity]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+_cache = None
+
+def launch_cache():
+    global _cache
+    if _cache is None:
+        _cache = LaunchCache(cache_directory())
+    return _cache
+
+class IncludeCache(object):
+    """Launch files included by other launch files, parsed once and kept in memory for all include
+    sites and later reloads. Entries are reused while modification time and size of a file do not
+    change, files are read through the launch cache otherwise."""
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        """Returns parsed data of a file, its digest and whether data came from a cache."""
+        status = os.stat(path)
+        stamp = (status.st_mtime_ns, status.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1], entry[2], True
+        data, digest, cached = self._cache.load(path)
+        with self._lock:
+            self._entries[path] = (stamp, data, digest)
+        return data, digest, cached
+
+_includes = None
+
+def include_cache():
+    global _includes
+    if _includes is None:
+        _includes = IncludeCache(launch_cache())
+    return _includes
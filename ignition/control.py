@@ -0,0 +1,158 @@
+
+import os
+import sys
+import json
+import queue
+import socket
+import socketserver
+import threading
+import argparse
+
+COMMANDS = ("status", "start", "stop", "restart", "tail")
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+
+    def _send(self, **message):
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            command = request.get("command")
+            if command not in COMMANDS:
+                raise ValueError("Unknown command: %s" % command)
+            getattr(self, "_" + command)(self.server.group, request)
+        except (ValueError, KeyError) as e:
+            self._send(error=str(e))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _status(self, group, request):
+        self._send(programs=group.status())
+
+    def _start(self, group, request):
+        self._send(messages=group.start_program(request["program"], request.get("cascade", False)))
+
+    def _stop(self, group, request):
+        self._send(messages=group.stop_program(request["program"], request.get("cascade", False)))
+
+    def _restart(self, group, request):
+        self._send(messages=group.restart_program(request["program"], request.get("cascade", False)))
+
+    def _tail(self, group, request):
+        program = group.program(request["program"])
+        history = request.get("lines", 0)
+        if program._direct():
+            for line in program.recent(history) if history > 0 else []:
+                self._send(line=line)
+            raise ValueError("Output of %s is written directly to %s" % (program.identifier, program.log))
+        lines = queue.Queue(maxsize=10000)
+
+        def listener(batch):
+            # Called from the output path, a slow client loses lines instead of stalling the program
+            for line in batch:
+                try:
+                    lines.put_nowait(line)
+                except queue.Full:
+                    pass
+
+        program.listen(listener)
+        try:
+            # Recent output comes from memory, a line may repeat if it arrives while history is sent
+            for line in program.recent(history) if history > 0 else []:
+                self._send(line=line)
+            while True:
+                try:
+                    line = lines.get(timeout=1)
+                except queue.Empty:
+                    self._send(heartbeat=True)
+                    continue
+                self._send(line=line)
+        finally:
+            program.unlisten(listener)
+
+class _ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+class ControlServer(object):
+    """Control socket that accepts commands for individual programs of a group. Requests are handled
+    in their own threads, so they never block supervision of programs."""
+
+    def __init__(self, group, path):
+        self._path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = _ControlServer(path, _ControlHandler)
+        self._server.group = group
+        self._thread = threading.Thread(target=self._server.serve_forever, name="control", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+def request(path, command, **arguments):
+    """Sends a request to a control socket, yields response messages."""
+    arguments["command"] = command
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall((json.dumps(arguments) + "\n").encode("utf-8"))
+        with connection.makefile("rb") as stream:
+            for line in stream:
+                yield json.loads(line.decode("utf-8"))
+
+def _format_uptime(uptime):
+    if uptime is None:
+        return "-"
+    minutes, seconds = divmod(int(uptime), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%d:%02d:%02d" % (hours, minutes, seconds)
+
+def client(argv):
+    """Entry point of ignite ctl, returns exit code."""
+    parser = argparse.ArgumentParser(prog="ignite ctl", description="Control programs of a running ignite instance")
+    parser.add_argument("--socket", default=os.environ.get("IGNITION_CONTROL"),
+        help="Path of the control socket, defaults to IGNITION_CONTROL environment variable")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("program", nargs="?", default=None)
+    parser.add_argument("--cascade", action="store_true", default=False,
+        help="Also stop and start dependent programs (or dependencies when starting)")
+    parser.add_argument("-n", "--lines", type=int, default=10,
+        help="Number of recent output lines shown by tail before new output")
+    args = parser.parse_args(argv)
+
+    if args.socket is None:
+        parser.error("control socket not specified")
+    if args.command != "status" and args.program is None:
+        parser.error("program not specified")
+
+    try:
+        for message in request(args.socket, args.command, program=args.program, cascade=args.cascade, lines=args.lines):
+            if "error" in message:
+                print("Error: %s" % message["error"], file=sys.stderr)
+                return 1
+            if "programs" in message:
+                print("%-20s %-10s %8s %8s %10s %-5s %-10s %s" % ("PROGRAM", "STATE", "PID", "ATTEMPTS", "UPTIME", "READY", "CPUS", "LIMITS"))
+                for status in message["programs"]:
+                    print("%-20s %-10s %8s %8d %10s %-5s %-10s %s" % (status["program"], status["state"],
+                        status["pid"] if status["pid"] is not None else "-", status["attempts"],
+                        _format_uptime(status["uptime"]), "yes" if status["ready"] else "no",
+                        status.get("cpus") or "-", status.get("limits") or "-"))
+            for line in message.get("messages", []):
+                print(line)
+            if "line" in message:
+                print(message["line"], flush=True)
+    except OSError as e:
+        print("Unable to connect to %s: %s" % (args.socket, e), file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,172 @@
+
+import os
+import re
+from collections.abc import Mapping
+
+from .graph import toposort
+
+_NAME = re.compile(r"\w+")
+
+def _scan(value, skip_escaped=True):
+    """Yields variable references of form $var, ${var} and ${var:-default} in a value as tuples of
+    start, end, name and default, which is None if not given. Defaults may contain references."""
+    position = 0
+    while True:
+        start = value.find("$", position)
+        if start < 0:
+            return
+        position = start + 1
+        if skip_escaped and start > 0 and value[start - 1] == "\\":
+            continue
+        match = _NAME.match(value, start + 1)
+        if match is not None:
+            yield start, match.end(), match.group(0), None
+            position = match.end()
+            continue
+        if value[start + 1:start + 2] != "{":
+            continue
+        cursor = start + 2
+        while cursor < len(value) and value[cursor] not in "}:":
+            cursor += 1
+        name = value[start + 2:cursor]
+        if value[cursor:cursor + 1] == "}":
+            yield start, cursor + 1, name, None
+            position = cursor + 1
+        elif value[cursor:cursor + 2] == ":-":
+            # Default ends at the brace that balances the opening one
+            depth = 1
+            end = cursor + 2
+            while end < len(value):
+                if value[end] == "{":
+                    depth += 1
+                elif value[end] == "}":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                end += 1
+            if depth == 0:
+                yield start, end + 1, name, value[cursor + 2:end]
+                position = end + 1
+
+def expandvars(path, default=None, additional=None, skip_escaped=True):
+    """Expand environment variables of form $var, ${var} and ${var:-default}.
+       If parameter 'skip_escaped' is True, all escaped variable references
+       (i.e. preceded by backslashes) are skipped.
+       Unknown variables are set to 'default'. If 'default' is None,
+       they are left unchanged. As in shell, a default also replaces an empty value.
+    """
+    if not path:
+        return path
+    def lookup(name):
+        if additional is not None and name in additional:
+            return additional[name]
+        return os.environ.get(name)
+    return _expand(path, lookup, default, skip_escaped)
+
+def _expand(value, lookup, default=None, skip_escaped=True):
+    parts = []
+    position = 0
+    for start, end, name, fallback in _scan(value, skip_escaped):
+        parts.append(value[position:start])
+        found = lookup(name)
+        if found is not None and (found or fallback is None):
+            parts.append(found)
+        elif fallback is not None:
+            parts.append(_expand(fallback, lookup, default, skip_escaped))
+        else:
+            parts.append(value[start:end] if default is None else default)
+        position = end
+    parts.append(value[position:])
+    return "".join(parts)
+
+def references(value):
+    """Returns names of all variables that a value refers to, including ones in defaults."""
+    names = set()
+    for _, _, name, fallback in _scan(value):
+        names.add(name)
+        if fallback is not None:
+            names.update(references(fallback))
+    return names
+
+class Environment(Mapping):
+    """A layer of environment variables on top of a parent layer. Variables of a layer are expanded
+    once, in order of their references to each other, a reference of a variable to its own name refers
+    to the value in the parent layer. Layers that other layers are built on cache their flattened
+    form, so programs share the resolved base instead of each holding a copy."""
+
+    def __init__(self, variables=None, parent=None, expand=True):
+        self._parent = parent
+        self._flat = None
+        self._shared = False
+        if parent is not None:
+            parent._shared = True
+        self._values = self._resolve(variables or {}) if expand else dict(variables or {})
+
+    def _resolve(self, variables):
+        graph = {name: {x for x in references(value) if x in variables} for name, value in variables.items()}
+        resolved = {}
+        def lookup(name):
+            if name in resolved:
+                return resolved[name]
+            if self._parent is not None:
+                return self._parent.get(name)
+            return None
+        try:
+            for block in toposort(graph):
+                for name in sorted(block):
+                    resolved[name] = _expand(variables[name], lookup)
+        except ValueError:
+            raise ValueError("Cyclic reference among environment variables: %s" % ", ".join(sorted(
+                name for name in variables if name not in resolved)))
+        return resolved
+
+    @property
+    def variables(self):
+        """Resolved variables defined in this layer."""
+        return dict(self._values)
+
+    def declared(self, root=None):
+        """Resolved variables of this layer and its parents up to but excluding the root layer."""
+        if self._parent is None or self._parent is root:
+            return dict(self._values)
+        result = self._parent.declared(root)
+        result.update(self._values)
+        return result
+
+    def flatten(self):
+        """Returns a dictionary with all variables, suitable as environment of a process."""
+        if self._flat is not None:
+            return self._flat
+        if self._parent is None:
+            result = dict(self._values)
+        else:
+            result = dict(self._parent.flatten())
+            result.update(self._values)
+        if self._shared:
+            self._flat = result
+        return result
+
+    def __getitem__(self, name):
+        if name in self._values:
+            return self._values[name]
+        if self._parent is not None:
+            return self._parent[name]
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self._values or (self._parent is not None and name in self._parent)
+
+    def __iter__(self):
+        return iter(self.flatten())
+
+    def __len__(self):
+        return len(self.flatten())
+
+_system = None
+
+def system_environment():
+    """Returns a shared layer with environment of the ignition process, values are taken literally."""
+    global _system
+    if _system is None:
+        _system = Environment(os.environ, expand=False)
+    return _system
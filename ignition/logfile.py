@@ -0,0 +1,218 @@
+
+import os
+import re
+import gzip
+import glob
+import queue
+import shutil
+import struct
+import threading
+import time
+import datetime
+
+from attributee import Attributee
+from attributee.primitives import Boolean, Float, Integer
+
+from .output import output_writer, RED
+from .resources import Size
+
+class Rotation(Attributee):
+    """Log rotation configuration, a log is rotated when it exceeds the size or when it is written
+    after the interval has elapsed since it was opened."""
+
+    size = Size(default=None, description="Size after which the log is rotated, e.g. 100M")
+    interval = Float(val_min=1, default=None, description="Time in seconds after which the log is rotated")
+    keep = Integer(val_min=0, default=5, description="Number of rotated segments to keep, 0 keeps all")
+    compress = Boolean(default=True, description="Compress rotated segments with gzip")
+
+class _Compressor(object):
+    """Compresses rotated segments in a background thread, shared by all logs."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="compressor", daemon=True)
+        self._thread.start()
+
+    def submit(self, path, callback=None):
+        self._queue.put((path, callback))
+
+    def _run(self):
+        while True:
+            path, callback = self._queue.get()
+            try:
+                compress(path)
+            except OSError as e:
+                output_writer().message("Unable to compress %s: %s" % (path, e), RED)
+            if callback is not None:
+                callback()
+
+_compressor = None
+_compressor_lock = threading.Lock()
+
+def compressor():
+    global _compressor
+    with _compressor_lock:
+        if _compressor is None:
+            _compressor = _Compressor()
+    return _compressor
+
+def compress(path):
+    """Compresses a file with gzip next to the original and removes the original."""
+    temporary = path + ".gz.tmp"
+    with open(path, "rb") as source, gzip.open(temporary, "wb") as destination:
+        shutil.copyfileobj(source, destination, 1024 * 1024)
+    os.replace(temporary, path + ".gz")
+    os.unlink(path)
+
+_SEGMENT = re.compile(r"\.(\d{8}-\d{6}(?:\.\d+)?)(\.gz)?$")
+
+def segments(path):
+    """Returns rotated segments of a log, oldest first, as tuples of path and compression flag."""
+    result = []
+    for candidate in glob.glob(glob.escape(path) + ".*"):
+        match = _SEGMENT.match(candidate[len(path):])
+        if match is not None:
+            stamp, _, counter = match.group(1).partition(".")
+            result.append(((stamp, int(counter or 0)), candidate, match.group(2) is not None))
+    return [(candidate, compressed) for _, candidate, compressed in sorted(result)]
+
+# Index entries are a timestamp and a byte offset in the log, written at most once per interval of bytes
+_INDEX = struct.Struct("<dQ")
+INDEX_INTERVAL = 65536
+
+def index_path(path):
+    return path + ".idx"
+
+def seek_time(path, timestamp):
+    """Returns the offset of a log from which all records written at or after the timestamp follow,
+    found with a binary search in the sparse index of the log. Returns 0 if there is no index."""
+    try:
+        handle = open(index_path(path), "rb")
+    except OSError:
+        return 0
+    with handle:
+        count = handle.seek(0, os.SEEK_END) // _INDEX.size
+        low, high = 0, count
+        # Finds the first entry that is not older than the timestamp, the log is read from the entry before
+        while low < high:
+            middle = (low + high) // 2
+            handle.seek(middle * _INDEX.size)
+            if _INDEX.unpack(handle.read(_INDEX.size))[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return 0
+        handle.seek((low - 1) * _INDEX.size)
+        return _INDEX.unpack(handle.read(_INDEX.size))[1]
+
+def _append(path, truncate=False):
+    """Opens a file in append mode, truncated first if requested, so that writes never overwrite
+    output that programs writing to the same file directly have appended in the meantime."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (os.O_TRUNC if truncate else 0)
+    return os.fdopen(os.open(path, flags, 0o644), "ab")
+
+class LogFile(object):
+    """Log file of a program that is rotated by size or age. Rotated segments are named by the time
+    of rotation and compressed in the background. Methods are not synchronized, callers serialize
+    writes as they would for a regular file. With index enabled, a sparse sidecar index that maps
+    time of writes to offsets is written along the log."""
+
+    def __init__(self, path, append=False, rotation=None, index=False):
+        self.path = path
+        self.rotation = rotation
+        self._handle = None
+        self._index = None
+        self._indexed = index
+        self._open(append)
+        if rotation is not None and rotation.compress:
+            # Segments of a previous run that were not compressed before it ended
+            for segment, compressed in segments(path):
+                if not compressed:
+                    compressor().submit(segment)
+
+    def _open(self, append):
+        self._handle = _append(self.path, not append)
+        self._size = self._handle.tell()
+        self._opened = time.monotonic()
+        if self._indexed:
+            self._index = _append(index_path(self.path), not append)
+            self._last = None
+
+    def write(self, data, timestamp=None):
+        """Writes data to the log, data with a timestamp is indexed if the index is enabled."""
+        if self._index is not None and timestamp is not None and \
+            (self._last is None or self._size - self._last >= INDEX_INTERVAL):
+            self._index.write(_INDEX.pack(timestamp, self._size))
+            self._last = self._size
+        self._handle.write(data)
+        self._size += len(data)
+        rotation = self.rotation
+        if rotation is not None and ((rotation.size is not None and self._size >= rotation.size) or
+            (rotation.interval is not None and time.monotonic() - self._opened >= rotation.interval)):
+            self.rotate()
+
+    def tell(self):
+        """Returns the offset after the last flushed write, other processes may have appended to the
+        file since then."""
+        return os.lseek(self._handle.fileno(), 0, os.SEEK_CUR)
+
+    def flush(self):
+        self._handle.flush()
+        if self._index is not None:
+            self._index.flush()
+
+    def _close(self):
+        self._handle.close()
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def reopen(self):
+        """Reopens the log at its path, used after the file was moved by an external tool."""
+        self._close()
+        self._open(True)
+
+    def rotate(self):
+        self._close()
+        segment = "%s.%s" % (self.path, datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+        candidate, counter = segment, 0
+        while os.path.exists(candidate) or os.path.exists(candidate + ".gz"):
+            counter += 1
+            candidate = "%s.%d" % (segment, counter)
+        try:
+            os.rename(self.path, candidate)
+        except OSError as e:
+            output_writer().message("Unable to rotate %s: %s" % (self.path, e), RED)
+            self._open(True)
+            return
+        if self._indexed:
+            # Offsets do not apply to a compressed segment, its index is removed
+            try:
+                if self.rotation.compress:
+                    os.unlink(index_path(self.path))
+                else:
+                    os.rename(index_path(self.path), index_path(candidate))
+            except OSError:
+                pass
+        self._open(False)
+        if self.rotation.compress:
+            compressor().submit(candidate, self.prune)
+        else:
+            self.prune()
+
+    def prune(self):
+        """Removes the oldest segments above the retention count."""
+        keep = self.rotation.keep if self.rotation is not None else 0
+        if keep == 0:
+            return
+        existing = segments(self.path)
+        for segment, compressed in existing[:max(0, len(existing) - keep)]:
+            for path in [segment] if compressed else [segment, index_path(segment)]:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def close(self):
+        self._close()
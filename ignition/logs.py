@@ -0,0 +1,71 @@
+
+import sys
+import json
+import heapq
+import argparse
+import datetime
+
+from .logfile import seek_time
+
+def parse_time(value):
+    """Parses a time given as seconds since epoch, as an ISO date and time or as a time of today."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        pass
+    try:
+        moment = datetime.time.fromisoformat(value)
+    except ValueError:
+        raise ValueError("Illegal time: %s" % value)
+    return datetime.datetime.combine(datetime.date.today(), moment).timestamp()
+
+def records(path, since=None, until=None):
+    """Yields records of a structured log in order of writing, starting at the indexed offset closest
+    to since. Lines that are not records are skipped."""
+    with open(path, "rb") as handle:
+        if since is not None:
+            handle.seek(seek_time(path, since))
+        for line in handle:
+            try:
+                record = json.loads(line)
+                timestamp = record["time"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if since is not None and timestamp < since:
+                continue
+            if until is not None and timestamp > until:
+                return
+            yield record
+
+def merge(paths, since=None, until=None):
+    """Merges records of several structured logs by time."""
+    return heapq.merge(*[records(path, since, until) for path in paths], key=lambda x: x["time"])
+
+def format_record(record):
+    moment = datetime.datetime.fromtimestamp(record["time"])
+    return "%s [%s] %s" % (moment.isoformat(sep=" ", timespec="milliseconds"), record.get("program"), record.get("message"))
+
+def main(argv):
+    """Entry point of ignite logs, returns exit code."""
+    parser = argparse.ArgumentParser(prog="ignite logs", description="Merge structured program logs by time")
+    parser.add_argument("logs", nargs="+", help="Log files written with logformat json")
+    parser.add_argument("--since", default=None, help="Show records from this time, seconds since epoch, date and time or time of today")
+    parser.add_argument("--until", default=None, help="Show records until this time")
+    parser.add_argument("--json", action="store_true", help="Print records as JSON lines")
+    args = parser.parse_args(argv)
+
+    try:
+        since = parse_time(args.since) if args.since is not None else None
+        until = parse_time(args.until) if args.until is not None else None
+        for record in merge(args.logs, since, until):
+            print(json.dumps(record) if args.json else format_record(record))
+    except BrokenPipeError:
+        return 0
+    except (OSError, ValueError) as e:
+        print("Error: %s" % e, file=sys.stderr)
+        return 1
+    return 0
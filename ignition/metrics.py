@@ -0,0 +1,218 @@
+
+import os
+import socketserver
+import threading
+import time
+
+from attributee import Attributee
+from attributee.primitives import Float, String
+
+from .output import output_writer, RED
+
+class MetricsSettings(Attributee):
+    """Resource metrics sampling and export configuration."""
+
+    interval = Float(val_min=0.1, default=5, description="Sampling interval in seconds")
+    file = String(default=None, description="Path of a file with metrics in Prometheus text format")
+    address = String(default=None, description="Metrics endpoint, host:port for HTTP or unix:path for a Unix socket")
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+class ProcessSample(object):
+
+    __slots__ = ("processes", "cpu", "rss", "threads", "fds", "read_bytes", "write_bytes")
+
+    def __init__(self):
+        self.processes = 0
+        self.cpu = 0.0
+        self.rss = 0
+        self.threads = 0
+        self.fds = 0
+        self.read_bytes = 0
+        self.write_bytes = 0
+
+def _read(path):
+    try:
+        with open(path, "rb") as handle:
+            return handle.read()
+    except OSError:
+        return None
+
+def sample_process_groups(groups, proc="/proc"):
+    """Aggregates resource usage of all processes in the given process groups with a single pass
+    over proc filesystem. Returns a dictionary mapping process group id to ProcessSample."""
+    samples = {group: ProcessSample() for group in groups}
+    if not samples:
+        return samples
+    try:
+        entries = os.listdir(proc)
+    except OSError:
+        return samples
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        stat = _read(os.path.join(proc, entry, "stat"))
+        if stat is None:
+            continue
+        # Process name may contain spaces and parentheses, fields start after the last one
+        fields = stat[stat.rfind(b")") + 2:].split()
+        try:
+            sample = samples.get(int(fields[2]))
+        except (IndexError, ValueError):
+            continue
+        if sample is None:
+            continue
+        sample.processes += 1
+        sample.cpu += sum(int(x) for x in fields[11:15]) / _CLOCK_TICKS
+        sample.threads += int(fields[17])
+        sample.rss += int(fields[21]) * _PAGE_SIZE
+        try:
+            sample.fds += len(os.listdir(os.path.join(proc, entry, "fd")))
+        except OSError:
+            pass
+        io = _read(os.path.join(proc, entry, "io"))
+        if io is not None:
+            for line in io.splitlines():
+                if line.startswith(b"read_bytes:"):
+                    sample.read_bytes += int(line[11:])
+                elif line.startswith(b"write_bytes:"):
+                    sample.write_bytes += int(line[12:])
+    return samples
+
+_METRICS = [
+    ("up", "gauge", "Program has a running process"),
+    ("processes", "gauge", "Number of processes in the program process group"),
+    ("cpu_seconds_total", "counter", "CPU time of the program process group"),
+    ("memory_rss_bytes", "gauge", "Resident memory of the program process group"),
+    ("threads", "gauge", "Number of threads in the program process group"),
+    ("open_fds", "gauge", "Number of open file descriptors in the program process group"),
+    ("io_read_bytes_total", "counter", "Bytes read from storage by the program process group"),
+    ("io_write_bytes_total", "counter", "Bytes written to storage by the program process group"),
+    ("attempts_total", "counter", "Number of times the program was started"),
+    ("uptime_seconds", "gauge", "Time since the current process was started"),
+    ("output_lines_total", "counter", "Output lines relayed by ignition"),
+    ("output_bytes_total", "counter", "Output bytes relayed by ignition"),
+]
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def render(programs, samples):
+    """Renders program metrics in Prometheus text exposition format."""
+    now = time.monotonic()
+    values = {name: [] for name, _, _ in _METRICS}
+    for program in programs:
+        label = "{program=\"%s\"}" % _escape(program.identifier)
+        process = program.process
+        sample = samples.get(process.pid) if process is not None else None
+        started = program._started
+        values["up"].append((label, 1 if sample is not None and sample.processes > 0 else 0))
+        values["attempts_total"].append((label, program.attempts))
+        values["uptime_seconds"].append((label, now - started if started is not None else 0))
+        values["output_lines_total"].append((label, program.output_lines))
+        values["output_bytes_total"].append((label, program.output_bytes))
+        if sample is None:
+            continue
+        values["processes"].append((label, sample.processes))
+        values["cpu_seconds_total"].append((label, sample.cpu))
+        values["memory_rss_bytes"].append((label, sample.rss))
+        values["threads"].append((label, sample.threads))
+        values["open_fds"].append((label, sample.fds))
+        values["io_read_bytes_total"].append((label, sample.read_bytes))
+        values["io_write_bytes_total"].append((label, sample.write_bytes))
+
+    lines = []
+    for name, kind, description in _METRICS:
+        lines.append("# HELP ignition_program_%s %s" % (name, description))
+        lines.append("# TYPE ignition_program_%s %s" % (name, kind))
+        for label, value in values[name]:
+            lines.append("ignition_program_%s%s %s" % (name, label, repr(value) if isinstance(value, float) else value))
+    return "\n".join(lines) + "\n"
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+def _create_server(address):
+    # HTTP modules take a while to import, they are only loaded when an endpoint is configured
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            body = self.server.sampler.text.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            # Unix socket clients have no address
+            return str(self.client_address[0]) if self.client_address else "local"
+
+        def log_message(self, format, *args):
+            pass
+
+    if address.startswith("unix:"):
+        path = address[5:]
+        if os.path.exists(path):
+            os.unlink(path)
+        return _UnixServer(path, MetricsHandler)
+    host, _, port = address.rpartition(":")
+    return ThreadingHTTPServer((host or "127.0.0.1", int(port)), MetricsHandler)
+
+class MetricsSampler(object):
+    """Samples resource usage of programs in a background thread and exports it."""
+
+    def __init__(self, programs, settings):
+        self._programs = list(programs)
+        self._settings = settings
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+        self.text = render([], {})
+
+    def start(self):
+        address = self._settings.address
+        if address is not None:
+            self._server = _create_server(address)
+            self._server.sampler = self
+            threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self._thread.start()
+
+    def update(self, programs):
+        self._programs = list(programs)
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if isinstance(self._server, _UnixServer):
+                try:
+                    os.unlink(self._server.server_address)
+                except OSError:
+                    pass
+            self._server = None
+
+    def sample(self):
+        processes = [program.process for program in self._programs]
+        groups = [process.pid for process in processes if process is not None]
+        self.text = render(self._programs, sample_process_groups(groups))
+        if self._settings.file is not None:
+            temporary = self._settings.file + ".tmp"
+            with open(temporary, "w") as handle:
+                handle.write(self.text)
+            os.replace(temporary, self._settings.file)
+        return self.text
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except OSError as e:
+                output_writer().message("Unable to export metrics: %s" % e, RED)
+            self._stop.wait(self._settings.interval)
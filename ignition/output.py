@@ -1,6 +1,14 @@
 
-
 import sys
+import atexit
+import codecs
+import heapq
+import itertools
+import threading
+from collections import deque
+
+from attributee import Attributee
+from attributee.primitives import Enumeration, Float, Integer
 
 # http://www.pixelbeat.org/programming/stdio_buffering/
 BLACK, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE = range(30, 38)
@@ -18,3 +26,301 @@ def print_colored(message, color=BLACK, bold=False):
         sys.stdout.write(COLOR_SEQ % (color))
     sys.stdout.write(message)
     sys.stdout.write(RESET_SEQ)
+
+def colored(message, color=BLACK, bold=False):
+    if bold:
+        return COLOR_SEQ % (color) + BOLD_SEQ + message + RESET_SEQ
+    return COLOR_SEQ % (color) + message + RESET_SEQ
+
+class RingBuffer(object):
+    """Fixed size buffer of the most recent output bytes, storage is allocated once so that memory
+    use stays constant. Writes are cheap copies, lines are only split when the buffer is read."""
+
+    def __init__(self, size):
+        self._data = bytearray(size)
+        self._size = size
+        self._end = 0
+        self._full = False
+
+    def write(self, data):
+        size = self._size
+        length = len(data)
+        if size == 0 or length == 0:
+            return
+        view = memoryview(data)
+        if length >= size:
+            self._data[:] = view[length - size:]
+            self._end = 0
+            self._full = True
+            return
+        first = min(length, size - self._end)
+        self._data[self._end:self._end + first] = view[:first]
+        if first < length:
+            self._data[:length - first] = view[first:]
+            self._full = True
+        self._end = (self._end + length) % size
+        if self._end == 0:
+            self._full = True
+
+    def read(self):
+        """Returns contents of the buffer, oldest byte first."""
+        if not self._full:
+            return bytes(self._data[:self._end])
+        return bytes(self._data[self._end:]) + bytes(self._data[:self._end])
+
+    def lines(self, count=None, encoding="utf-8"):
+        """Returns the most recent complete lines, a line cut by the start of the buffer is omitted."""
+        return tail_lines(self.read(), count, self._full, encoding)
+
+    def clear(self):
+        self._end = 0
+        self._full = False
+
+def tail_lines(data, count=None, partial=True, encoding="utf-8"):
+    """Splits a block of output into lines, if partial is set the first line is considered incomplete."""
+    lines = data.decode(encoding, errors="replace").splitlines()
+    if partial and lines:
+        lines = lines[1:]
+    if count is not None:
+        lines = lines[-count:] if count > 0 else []
+    return lines
+
+class LineBuffer(object):
+    """Splits a stream of bytes into lines. Bytes are decoded incrementally, so multi-byte characters
+    may span chunks, and invalid data is replaced instead of raising an error. A line longer than limit
+    characters is either split into several lines or truncated, so the buffer never holds more than
+    limit characters.
+    """
+
+    def __init__(self, limit=65536, truncate=False, encoding="utf-8"):
+        self._limit = limit
+        self._truncate = truncate
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._pending = ""
+        self._discard = False
+        self.truncated = 0
+
+    def feed(self, data):
+        """Consumes a chunk of bytes and returns a list of complete lines without line endings."""
+        return self._split(self._decoder.decode(data))
+
+    def flush(self):
+        """Returns the remaining incomplete line (if any) and resets the decoder."""
+        lines = self._split(self._decoder.decode(b"", True))
+        if self._pending and not self._discard:
+            lines.append(self._pending)
+        self._pending = ""
+        self._discard = False
+        self._decoder.reset()
+        return lines
+
+    def _split(self, text):
+        if not text:
+            return []
+        lines = text.split("\n")
+        lines[0] = self._pending + lines[0]
+        self._pending = lines.pop()
+        if self._discard and lines:
+            # Remainder of a truncated line ends with the first newline
+            lines.pop(0)
+            self._discard = False
+        if len(self._pending) > self._limit:
+            if self._truncate:
+                if not self._discard:
+                    lines.append(self._pending[:self._limit])
+                    self.truncated += 1
+                self._discard = True
+                self._pending = ""
+            else:
+                while len(self._pending) > self._limit:
+                    lines.append(self._pending[:self._limit])
+                    self._pending = self._pending[self._limit:]
+        if any(len(line) > self._limit for line in lines):
+            lines = self._limited(lines)
+        return lines
+
+    def _limited(self, lines):
+        limited = []
+        for line in lines:
+            if len(line) <= self._limit:
+                limited.append(line)
+            elif self._truncate:
+                limited.append(line[:self._limit])
+                self.truncated += 1
+            else:
+                limited.extend(line[i:i + self._limit] for i in range(0, len(line), self._limit))
+        return limited
+
+OVERFLOW_POLICIES = ("block", "drop", "sample")
+
+class OutputSettings(Attributee):
+    """Console output pipeline configuration."""
+
+    capacity = Integer(val_min=1, default=10000, description="Maximum number of queued lines per program")
+    overflow = Enumeration({x: x for x in OVERFLOW_POLICIES}, default="block",
+        description="What to do when a queue is full: block the producer, drop oldest lines or sample new lines")
+    sample = Integer(val_min=2, default=10, description="Keep every n-th line of a full queue when sampling")
+    interval = Float(val_min=0, default=0.05, description="Maximum time in seconds that a line waits to be written")
+    batch = Integer(val_min=1, default=65536, description="Number of characters that triggers an immediate write")
+
+class OutputChannel(object):
+    """Bounded queue of lines from a single source, only OutputWriter reads from it."""
+
+    def __init__(self, writer, prefix, color, capacity, overflow, sample):
+        self._writer = writer
+        self._prefix = colored(prefix, color) if prefix else ""
+        self._lines = deque()
+        self._capacity = capacity
+        self._overflow = overflow
+        self._sample = sample
+        self._offered = 0
+        self._reported = 0
+        self.written = 0
+        self.dropped = 0
+
+    def push(self, lines, block=True):
+        """Queues lines (without line endings) for writing. If the queue is full the overflow policy
+        is applied, blocking is only done if the caller allows it, otherwise oldest lines are dropped."""
+        writer = self._writer
+        with writer._condition:
+            for line in lines:
+                if len(self._lines) >= self._capacity:
+                    if self._overflow == "block" and block:
+                        writer._blocked += 1
+                        writer._condition.notify_all()
+                        writer._condition.wait_for(lambda: len(self._lines) < self._capacity or writer._closed)
+                        writer._blocked -= 1
+                    elif self._overflow == "sample":
+                        self._offered += 1
+                        self.dropped += 1
+                        if self._offered % self._sample != 0:
+                            continue
+                        self._lines.popleft()
+                    else:
+                        self._lines.popleft()
+                        self.dropped += 1
+                self._enqueue(line)
+            writer._notify()
+
+    def message(self, message):
+        """Queues a message that is never dropped and never blocks."""
+        with self._writer._condition:
+            self._enqueue(message)
+            self._writer._notify()
+
+    def _enqueue(self, line):
+        text = self._prefix + line + "\n"
+        self._lines.append((next(self._writer._sequence), text))
+        self._writer._size += len(text)
+
+    def _drain(self):
+        lines = list(self._lines)
+        self._lines.clear()
+        self.written += len(lines)
+        if self.dropped > self._reported:
+            text = self._prefix + colored("%d lines dropped" % (self.dropped - self._reported), RED) + "\n"
+            lines.append((lines[-1][0] if lines else 0, text))
+            self._reported = self.dropped
+        return lines
+
+class OutputWriter(object):
+    """Writes output of all channels to a stream from a single thread. Lines are written in the
+    order they were queued, in batches with one write per batch. A batch is written when it reaches
+    a size limit or when the oldest line in it has waited for the configured interval."""
+
+    def __init__(self, stream=None, settings=None):
+        self._stream = stream
+        self._settings = settings if settings is not None else OutputSettings()
+        self._condition = threading.Condition()
+        self._channels = []
+        self._sequence = itertools.count()
+        self._size = 0
+        self._idle = False
+        self._blocked = 0
+        self._closed = False
+        self._general = self.channel("", BLACK)
+        self._thread = threading.Thread(target=self._run, name="output")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def configure(self, settings):
+        with self._condition:
+            self._settings = settings
+            for channel in self._channels:
+                channel._capacity = settings.capacity
+                channel._overflow = settings.overflow
+                channel._sample = settings.sample
+
+    def channel(self, prefix, color):
+        with self._condition:
+            channel = OutputChannel(self, prefix, color, self._settings.capacity, self._settings.overflow, self._settings.sample)
+            self._channels.append(channel)
+            return channel
+
+    def message(self, message, color=BLACK, bold=False):
+        self._general.message(colored(message, color, bold))
+
+    @property
+    def dropped(self):
+        return sum(channel.dropped for channel in self._channels)
+
+    def _notify(self):
+        # Called with condition held, wakes up the writer if it is idle or if a batch is full
+        if self._idle or self._size >= self._settings.batch:
+            self._condition.notify_all()
+
+    def _collect(self):
+        batches = [channel._drain() for channel in self._channels]
+        self._size = 0
+        self._condition.notify_all()
+        return "".join(text for _, text in heapq.merge(*batches, key=lambda x: x[0]))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._idle = True
+                self._condition.wait_for(lambda: self._size > 0 or self._closed)
+                self._idle = False
+                # Waiting for more lines makes no sense if a producer is already blocked on a full queue
+                self._condition.wait_for(lambda: self._size >= self._settings.batch or self._blocked or self._closed,
+                    timeout=self._settings.interval)
+                text = self._collect()
+                closed = self._closed
+            self._write(text)
+            if closed:
+                break
+
+    def _write(self, text):
+        if not text:
+            return
+        stream = self._stream if self._stream is not None else sys.stdout
+        try:
+            stream.write(text)
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+
+    def flush(self):
+        """Writes all queued lines from the calling thread."""
+        with self._condition:
+            text = self._collect()
+        self._write(text)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(1)
+        self.flush()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def output_writer():
+    """Returns the shared console writer, it is created on first use and drained at exit."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = OutputWriter()
+            atexit.register(_writer.close)
+        return _writer
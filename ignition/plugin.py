@@ -1,37 +1,86 @@
 
+import os
+import re
+import asyncio
+import inspect
 import shlex
 import time
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import nullcontext
 
 from attributee import Attributee, Include, List
 from attributee.containers import Map, Tuple
 from attributee.object import import_class
 from attributee.primitives import Boolean, Enumeration, Integer, String
 
+from .environment import Environment, expandvars, system_environment
+from .output import output_writer, RED
+from .trace import tracer
+
 _plugin_cache = {}
+_plugin_scanned = False
+
+def _builtin_plugins():
+    return {"debug": Debug, "wait": Wait, "docker": Docker, "exportenv": ExportEnvironment}
+
+def _entry_points(name=None):
+    # Scanning entry points reads metadata of all installed distributions, it is only done when needed
+    from importlib.metadata import entry_points
+    try:
+        entrypoints = entry_points(group="ignition")
+    except TypeError:
+        entrypoints = entry_points().get("ignition", [])
+    return [entrypoint for entrypoint in entrypoints if name is None or entrypoint.name == name]
+
+def _register(entrypoint):
+    plugin = entrypoint.load()
+    if isinstance(plugin, type) and issubclass(plugin, Plugin):
+        _plugin_cache.setdefault(entrypoint.name, plugin)
 
 def plugin_registry():
+    """Returns all available plugins, including the ones registered by installed packages."""
+    global _plugin_scanned
     from attributee.containers import ReadonlyMapping
-    from importlib.metadata import entry_points
-    entrypoints = entry_points().get("ignition", {})
-    
-    # Only do this once
-    if len(_plugin_cache) == 0:
-        _plugin_cache["debug"] = Debug
-        _plugin_cache["wait"] = Wait
-        _plugin_cache["docker"] = Docker
-        _plugin_cache["exportenv"] = ExportEnvironment
 
-        for entrypoint in entrypoints:
-            plugin = entrypoint.load()
-            if issubclass(plugin, Plugin):
-                _plugin_cache[entrypoint.name] = plugin
+    # Only do this once
+    if not _plugin_scanned:
+        _plugin_cache.update(_builtin_plugins())
+        for entrypoint in _entry_points():
+            _register(entrypoint)
+        _plugin_scanned = True
 
     return ReadonlyMapping(_plugin_cache)
 
-def run_plugins(plugins, hook, *args):
-    for plugin in plugins:
-        if hasattr(plugin, hook):
-            getattr(plugin, hook)(*args)
+def find_plugin(name):
+    """Returns plugin class for a name of a built in or registered plugin or a class name. Entry points
+    of installed packages are only scanned for names that are not built in."""
+    if not _plugin_cache:
+        _plugin_cache.update(_builtin_plugins())
+    if name in _plugin_cache:
+        return _plugin_cache[name]
+    if "." not in name and not _plugin_scanned:
+        for entrypoint in _entry_points(name):
+            _register(entrypoint)
+        if name in _plugin_cache:
+            return _plugin_cache[name]
+    plugin = import_class(name)
+    if not issubclass(plugin, Plugin):
+        raise ValueError("Not a plugin class: %s" % name)
+    return plugin
+
+def concurrent(hook):
+    """Marks a plugin hook as safe to run concurrently for different programs. Other hooks of a plugin
+    are serialized when programs are started or stopped in parallel."""
+    hook.concurrent = True
+    return hook
+
+def asynchronous(hook):
+    """Marks a plugin hook to run in the background, the group does not wait for it to finish before it
+    continues. Coroutine functions are asynchronous as well and run in their own event loop."""
+    hook.asynchronous = True
+    return hook
 
 class Plugin(object):
 
@@ -53,6 +102,95 @@ class Plugin(object):
     def on_program_stopped(self, program):
         pass
 
+    def on_group_init(self, group):
+        pass
+
+    def on_group_start(self, group):
+        pass
+
+    def on_group_started(self, group):
+        pass
+
+    def on_group_stop(self, group):
+        pass
+
+    def on_group_stopped(self, group):
+        pass
+
+HOOKS = ("on_program_init", "on_program_start", "on_program_started", "on_program_stop", "on_program_stopped",
+    "on_group_init", "on_group_start", "on_group_started", "on_group_stop", "on_group_stopped")
+
+class _Handler(object):
+
+    def __init__(self, plugin, hook, lock):
+        method = getattr(type(plugin), hook)
+        self.name = type(plugin).__name__
+        self.hook = hook
+        self.function = getattr(plugin, hook)
+        self.asynchronous = getattr(method, "asynchronous", False) or inspect.iscoroutinefunction(method)
+        self.lock = None if getattr(method, "concurrent", False) else lock
+
+class HookDispatcher(object):
+    """Calls plugin hooks through a table of the hooks that plugins override, built once for a group.
+    Records number of calls and cumulative time of every hook of every plugin."""
+
+    def __init__(self, plugins, workers=4):
+        self._table = {}
+        self._statistics = {}
+        self._lock = threading.Lock()
+        self._workers = workers
+        self._executor = None
+        self._pending = set()
+        locks = [threading.RLock() for _ in plugins]
+        for hook in HOOKS:
+            self._table[hook] = [_Handler(plugin, hook, lock) for plugin, lock in zip(plugins, locks)
+                if getattr(type(plugin), hook, None) not in (None, getattr(Plugin, hook))]
+
+    def dispatch(self, hook, *args):
+        for handler in self._table.get(hook, []):
+            if handler.asynchronous:
+                self._submit(handler, args)
+            else:
+                self._call(handler, args)
+
+    def _call(self, handler, args):
+        # Hooks of a program are traced on its timeline, group hooks on the timeline of ignition
+        program = getattr(args[0], "identifier", None) if args else None
+        with tracer().span(handler.hook, "plugin", program, plugin=handler.name), handler.lock or nullcontext():
+            start = time.perf_counter()
+            result = handler.function(*args)
+            if inspect.iscoroutine(result):
+                asyncio.run(result)
+            duration = time.perf_counter() - start
+        with self._lock:
+            count, total = self._statistics.get((handler.name, handler.hook), (0, 0))
+            self._statistics[(handler.name, handler.hook)] = (count + 1, total + duration)
+
+    def _submit(self, handler, args):
+        def done(future):
+            with self._lock:
+                self._pending.discard(future)
+            if future.exception() is not None:
+                output_writer().message("Plugin hook %s.%s failed: %s" % (handler.name, handler.hook, future.exception()), RED)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="hooks")
+            future = self._executor.submit(self._call, handler, args)
+            self._pending.add(future)
+        future.add_done_callback(done)
+
+    def drain(self, timeout=None):
+        """Waits for hooks running in the background."""
+        with self._lock:
+            pending = list(self._pending)
+        if pending:
+            wait(pending, timeout)
+
+    def statistics(self):
+        """Returns a dictionary mapping plugin name and hook to number of calls and cumulative time."""
+        with self._lock:
+            return dict(self._statistics)
+
 class Debug(Plugin):
 
     def __init__(self):
@@ -60,11 +198,13 @@ class Debug(Plugin):
         # TODO: only if gdb is available?
         self._prefix = "gdb --batch --quiet -ex run -ex \"bt\" -ex quit --args  "
 
+    @concurrent
     def on_program_init(self, program):
         program._debug = program.auxiliary.get("debug", False)
         if program._debug:
             program.command = self._prefix + program.command
 
+    @concurrent
     def on_program_start(self, program):
         if program._debug:
             program.announce("Entering debug mode: %s" % program.command)
@@ -77,17 +217,24 @@ class Wait(Plugin):
     def on_program_init(self, program):
         program._wait = program.auxiliary.get("wait", 0)
 
+    @concurrent
     def on_program_started(self, program):
         wait = getattr(program, "_wait", 0)
         if wait > 0:
             time.sleep(wait)
 
+    @concurrent
     def on_program_stopped(self, program):
         wait = getattr(program, "_wait", 0)
         if wait > 0:
             time.sleep(wait)
 
 class Docker(Plugin):
+    """Runs programs in Docker containers. Images of all programs are pulled in the background as soon
+    as the group is loaded, containers are created before the group starts, so that starting and
+    restarting a program only attaches to its container with docker start. Containers are removed when
+    programs stop. The executable and the number of concurrent pulls are set with environment variables
+    IGNITION_DOCKER and IGNITION_DOCKER_PULLS."""
 
     class ContainerConfig(Attributee):
 
@@ -95,36 +242,139 @@ class Docker(Plugin):
         volumes = List(Tuple(String(), String(), separator=":"), default=[])
         devices = List(Tuple(String(), String(), separator=":"), default=[])
 
-    def __init__(self):
+    def __init__(self, executable=None, pulls=None):
         super(Docker, self).__init__()
-
+        self._executable = executable or os.environ.get("IGNITION_DOCKER", "docker")
+        workers = max(1, int(pulls or os.environ.get("IGNITION_DOCKER_PULLS", 4)))
+        # Separate pools, container tasks wait for pulls and must not occupy the workers that pull
+        self._pulling = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docker-pull")
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docker")
+        self._pulls = {}
+        self._containers = {}
+        self._lock = threading.Lock()
+
+    def _docker(self, *arguments):
+        try:
+            result = subprocess.run([self._executable] + list(arguments), stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError as e:
+            raise RuntimeError("Unable to run %s: %s" % (self._executable, e))
+        if result.returncode != 0:
+            raise RuntimeError(result.stdout.decode("utf-8", "replace").strip() or
+                "%s %s failed with exit code %d" % (self._executable, arguments[0], result.returncode))
+        return result.stdout
+
+    def _pull(self, image):
+        try:
+            self._docker("image", "inspect", image)
+        except RuntimeError:
+            self._docker("pull", image)
+
+    def _image(self, image):
+        with self._lock:
+            if image not in self._pulls:
+                self._pulls[image] = self._pulling.submit(self._pull, image)
+            return self._pulls[image]
+
+    @concurrent
     def on_program_init(self, program):
         config = program.auxiliary.get("docker", None)
-        
+        program._docker = None
+        if config is None:
+            return
+        program._docker = Docker.ContainerConfig(**config)
+        program._container = re.sub(r"[^a-zA-Z0-9_.-]", "_", "ignition-%s-%d" % (program.identifier, os.getpid()))
+        program._container_command = program.command
+        program.command = "%s start -a %s" % (shlex.quote(self._executable), program._container)
+
+    @concurrent
+    def on_group_init(self, group):
+        for program in group._programs.values():
+            if getattr(program, "_docker", None) is not None:
+                self._image(program._docker.image)
+
+    def _create(self, program):
+        config = program._docker
+
         def format_bind(x):
             if len(x) == 1:
                 return "%s:%s" % (x[0], x[0])
-            if len(x) == 2:
-                return "%s:%s" % (x[0], x[1])
-        
-        if config is not None:
-            config = Docker.ContainerConfig(**config)
-            print(list(config.volumes))
-            volumes = " ".join(["-v %s" % format_bind(x) for x in config.volumes])
-            devices = " ".join(["--device %s" % format_bind(x) for x in config.devices])
-    
-            environment = " ".join(["--env %s=%s" % (k, v) for k, v in program.environment.items()])
-    
-            command = "docker run --sig-proxy --rm -t -a STDOUT -a STDERR %s %s %s %s " % (volumes, devices, environment, config.image)
-
-            program.command = command + program.command
-            print(program.command)
+            return "%s:%s" % (x[0], x[1])
+
+        arguments = ["create", "--name", program._container, "-t"]
+        for volume in config.volumes:
+            arguments.extend(["-v", format_bind(volume)])
+        for device in config.devices:
+            arguments.extend(["--device", format_bind(device)])
+        for k, v in program.environment.items():
+            arguments.extend(["--env", "%s=%s" % (k, v)])
+        arguments.append(config.image)
+        # Programs are not prepared yet, their resolved layer is assigned when the group is read
+        environment = program._layer if program._layer is not None else Environment(program.environment, system_environment())
+        arguments.extend(shlex.split(expandvars(program._container_command, additional=environment)))
+
+        try:
+            self._image(config.image).result()
+        except RuntimeError as e:
+            raise RuntimeError("Unable to pull image %s: %s" % (config.image, e))
+        self._docker(*arguments)
+
+    def _container(self, program):
+        with self._lock:
+            if program not in self._containers:
+                self._containers[program] = self._executor.submit(self._create, program)
+            return self._containers[program]
+
+    @concurrent
+    def on_group_start(self, group):
+        # Containers of all programs are created concurrently before the first program starts
+        for program in group._programs.values():
+            if getattr(program, "_docker", None) is not None:
+                self._container(program)
+
+    @concurrent
+    def on_program_start(self, program):
+        if getattr(program, "_docker", None) is None:
+            return
+        try:
+            self._container(program).result()
+        except RuntimeError as e:
+            program.announce("Unable to create container: %s" % e)
+            with self._lock:
+                self._containers.pop(program, None)
+
+    def _remove(self, program):
+        with self._lock:
+            future = self._containers.pop(program, None)
+        if future is None:
+            return
+        try:
+            future.result()
+            # Also stops the container if the client was killed before it could forward the signal
+            self._docker("rm", "-f", program._container)
+        except RuntimeError:
+            pass
+
+    @concurrent
+    def on_program_stopped(self, program):
+        if getattr(program, "_docker", None) is not None:
+            self._remove(program)
+
+    @concurrent
+    def on_group_stopped(self, group):
+        with self._lock:
+            containers = dict(self._containers)
+        # Removal waits for creation, so creation has to finish before workers are taken by removals
+        wait(list(containers.values()))
+        for future in [self._executor.submit(self._remove, program) for program in containers]:
+            future.result()
 
 class ExportEnvironment(Plugin):
 
     def __init__(self):
         super(ExportEnvironment, self).__init__()
 
+    @concurrent
     def on_program_start(self, program):
         env = " ".join(["\"{}={}\"".format(k, v) for k, v in program.environment.items()])
         if not program.directory is None:
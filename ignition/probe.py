@@ -0,0 +1,101 @@
+
+import os
+import re
+import shlex
+import socket
+import subprocess
+
+from attributee import Attributee
+from attributee.primitives import Float, Integer, String
+
+def check_tcp(address, timeout=1):
+    host, _, port = address.rpartition(":")
+    try:
+        with socket.create_connection((host or "localhost", int(port)), timeout=timeout):
+            return True
+    except (OSError, ValueError):
+        return False
+
+def check_socket(path, timeout=1):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as handle:
+        handle.settimeout(timeout)
+        try:
+            handle.connect(path)
+            return True
+        except OSError:
+            return False
+
+def check_file(path):
+    return os.path.exists(path)
+
+def check_command(command, environment=None, directory=None, timeout=None):
+    try:
+        return subprocess.run(shlex.split(command), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, env=environment, cwd=directory, timeout=timeout).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+class Readiness(Attributee):
+    """Readiness probe configuration, all configured checks have to succeed for a program to be ready."""
+
+    tcp = String(default=None, description="Address in form host:port that has to accept connections")
+    socket = String(default=None, description="Path of a Unix socket that has to accept connections")
+    file = String(default=None, description="Path of a file that has to exist")
+    output = String(default=None, description="Regular expression that has to match a line of program output")
+    command = String(default=None, description="Command that has to exit with code 0")
+    timeout = Float(val_min=0, default=30, description="Time in seconds after which the program is considered not ready")
+    interval = Float(val_min=0.01, default=0.5, description="Time in seconds between two checks")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pattern = re.compile(self.output) if self.output is not None else None
+
+    def match(self, line):
+        """Returns True if an output line satisfies the output check."""
+        return self._pattern is not None and self._pattern.search(line) is not None
+
+    def check(self, expand, environment=None, directory=None):
+        """Runs all polled checks once, output check is handled by the program itself. Function
+        expand is used to resolve variables in addresses and paths."""
+        if self.tcp is not None and not check_tcp(expand(self.tcp), self.interval):
+            return False
+        if self.socket is not None and not check_socket(expand(self.socket), self.interval):
+            return False
+        if self.file is not None and not check_file(expand(self.file)):
+            return False
+        if self.command is not None and not check_command(expand(self.command), environment, directory, self.timeout):
+            return False
+        return True
+
+    def describe(self):
+        checks = []
+        for name in ["tcp", "socket", "file", "output", "command"]:
+            value = getattr(self, name)
+            if value is not None:
+                checks.append("%s %s" % (name, value))
+        return ", ".join(checks)
+
+class Liveness(Attributee):
+    """Liveness check configuration, a program that fails a check threshold times in a row is
+    considered hung and is restarted."""
+
+    silence = Float(val_min=0, default=None, description="Time in seconds without output after which a check fails")
+    cpu = Float(val_min=0, default=None, description="Fraction of a CPU above which a program without output is stuck")
+    tcp = String(default=None, description="Address in form host:port that has to accept connections")
+    command = String(default=None, description="Command that has to exit with code 0")
+    timeout = Float(val_min=0, default=5, description="Time in seconds after which a connection or command fails")
+    interval = Float(val_min=0.1, default=5, description="Time in seconds between two checks")
+    threshold = Integer(val_min=1, default=3, description="Number of consecutive failures of a check that trigger a restart")
+    initial = Float(val_min=0, default=10, description="Time in seconds after start before checks begin")
+
+    def describe(self):
+        checks = []
+        if self.silence is not None:
+            checks.append("silence %g s" % self.silence)
+        if self.cpu is not None:
+            checks.append("cpu %g" % self.cpu)
+        for name in ["tcp", "command"]:
+            value = getattr(self, name)
+            if value is not None:
+                checks.append("%s %s" % (name, value))
+        return ", ".join(checks)
@@ -1,6 +1,5 @@
 
 import os
-import re
 import sys
 import time, datetime
 import subprocess
@@ -8,17 +7,31 @@ import threading
 import shlex
 import signal
 import itertools
+import json
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from attributee import Attributee, Include, List, Unclaimed
+from attributee import Attributee, Include, List, Nested, Unclaimed
 from attributee.containers import Map
-from attributee.object import import_class
-from attributee.primitives import Boolean, Enumeration, Integer, String
+from attributee.primitives import Boolean, Enumeration, Float, Integer, String
 from attributee.io import Serializable
 
 from . import is_linux
+from .logfile import LogFile, Rotation
+from .environment import Environment, expandvars, system_environment
 from .graph import toposort
-from .output import print_colored, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE, LIGHTBLACK, LIGHTRED, LIGHTGREEN, LIGHTYELLOW, LIGHTBLUE, LIGHTMAGENTA, LIGHTCYAN, LIGHTWHITE
-from .plugin import plugin_registry, run_plugins, Plugin
+from .output import output_writer, tail_lines, LineBuffer, RingBuffer, OutputSettings, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE, LIGHTBLACK, LIGHTRED, LIGHTGREEN, LIGHTYELLOW, LIGHTBLUE, LIGHTMAGENTA, LIGHTCYAN, LIGHTWHITE
+from .cache import include_cache, launch_cache
+from .plugin import find_plugin, HookDispatcher
+from .timings import timings
+from .trace import tracer
+from .control import ControlServer
+from .metrics import MetricsSampler, MetricsSettings
+from .probe import Liveness, Readiness
+from .resources import Affinity, CgroupTree, Limits, Size, cgroup_tree, resolve_affinity, format_cpus
+from .restart import Restart
+from .supervisor import Supervisor
+from .watchdog import Watchdog
 
 _signals = {
     "sigint": signal.SIGINT,
@@ -33,32 +46,9 @@ def clean_dictionary(dictionary, *keys):
         if key in dictionary:
             del dictionary[key]
 
-def expandvars(path, default=None, additional={}, skip_escaped=True):
-    """Expand environment variables of form $var and ${var}.
-       If parameter 'skip_escaped' is True, all escaped variable references
-       (i.e. preceded by backslashes) are skipped.
-       Unknown variables are set to 'default'. If 'default' is None,
-       they are left unchanged.
-    """
-    if not path:
-        return path
-    def replace_var(m):
-        varname = m.group(2) or m.group(1)
-        if additional and varname in additional:
-            return additional[varname]
-        return os.environ.get(varname, m.group(0) if default is None else default)
-    reVar = (r'(?<!\\)' if skip_escaped else '') + r'\$(\w+|\{([^}]*)\})'
-    return re.sub(reVar, replace_var, path)
-
 def mergevars(base, update):
-    result = dict(base)
-    for var in update.keys():
-        additional = dict(update)
-        del additional[var]
-        env = dict(base)
-        env.update(additional)
-        result[var] = expandvars(update[var], additional=env)
-    return result
+    """Merges two sets of variables, variables of both are expanded."""
+    return Environment(update, Environment(base)).declared()
 
 def get_userid(username):
     from pwd import getpwnam
@@ -85,9 +75,13 @@ def get_groupid(groupname):
         print("Warning: group %s does not exist" % groupname)
         return (None, "", [])
 
-def prepare_and_demote(user_uid, user_gid, user_groups=[]):
+def prepare_and_demote(user_uid, user_gid, user_groups=[], cpus=None, setup=None):
     def result():
         os.setpgrp()
+        if cpus is not None:
+            os.sched_setaffinity(0, cpus)
+        if setup is not None:
+            setup()
         if len(user_groups) > 0:
             os.setgroups(user_groups)
         if not user_gid is None:
@@ -96,6 +90,27 @@ def prepare_and_demote(user_uid, user_gid, user_groups=[]):
             os.setuid(user_uid)
     return result
 
+def spawn_arguments(user_uid, user_gid, user_groups=[], native=None, cpus=None, setup=None):
+    """Returns arguments for subprocess.Popen that place the child in a new process group and demote it.
+       Native Popen arguments are used where available (Python 3.11 and newer), these do not require
+       running Python code in the child. Popen only uses vfork without user, group and preexec_fn, so a
+       program that is demoted still spawns with fork. Older interpreters, CPU pinning and limits, which
+       have no native arguments, fall back to prepare_and_demote as a preexec_fn.
+       Setup is called in the child before it is demoted.
+    """
+    if native is None:
+        native = sys.version_info >= (3, 11) and cpus is None and setup is None
+    if not native:
+        return dict(preexec_fn=prepare_and_demote(user_uid, user_gid, user_groups, cpus, setup))
+    arguments = dict(process_group=0)
+    if len(user_groups) > 0:
+        arguments["extra_groups"] = list(user_groups)
+    if not user_gid is None:
+        arguments["group"] = user_gid
+    if not user_uid is None:
+        arguments["user"] = user_uid
+    return arguments
+
 
 class ProgramObserver(object):
 
@@ -105,7 +120,10 @@ class ProgramObserver(object):
     def on_stop(self, program):
         pass
 
-_TERMINAL_LOCK = threading.Lock()
+_CHUNK_SIZE = 65536
+
+# Time that a killed program gets to be reaped before its run is given up on
+_REAP_TIMEOUT = 5
 _COLOR_POOL = iter(itertools.cycle([GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE, LIGHTBLACK,
                   LIGHTRED, LIGHTGREEN, LIGHTYELLOW, LIGHTBLUE, LIGHTMAGENTA, LIGHTCYAN, LIGHTWHITE]))
 
@@ -116,158 +134,691 @@ class ProgramHandler(Attributee):
     environment = Map(String(), readonly=False)
 
     required = Boolean(default=False)
-    restart = Boolean(default=False)
+    restart = Restart(default=False, description="Restart policy, a boolean, a number of attempts or a policy mapping")
 
     user = String(default=None)
     group = String(default=None)
     console = String(default=None)
     depends = List(String(), default=[])
-    log = String(default=None)
+    log = String(default=None, description="Log file, a log that is moved by an external tool and reopened "
+        "on SIGUSR1 requires direct output to be disabled")
     logappend = Boolean(default=False)
+    rotate = Nested(Rotation, default=None, description="Log rotation, disables direct output to the log")
+    logformat = Enumeration({"raw": "raw", "json": "json"}, default="raw",
+        description="Log format, json writes timestamped records as JSON lines with a time index, disables direct output to the log")
+    direct = Boolean(default=True, description="Program writes directly to the log file if its output is not needed otherwise, "
+        "such a log can only be truncated in place, the program keeps writing to a moved file")
+    maxline = Integer(val_min=1, default=65536, description="Maximum line length in characters")
+    truncate = Boolean(default=False, description="Truncate longer lines instead of splitting them")
+    history = Size(default=65536, description="Size of the buffer of most recent output, 0 disables it")
+    crashlines = Integer(val_min=0, default=20, description="Number of recent output lines printed when the program fails")
+    crashfile = String(default=None, description="File that recent output is appended to when the program fails")
 
     delay = Integer(val_min=0, default=0)
 
     signal = Enumeration(_signals, default="term")
+    grace = Float(val_min=0, default=5, description="Time in seconds between stop signal and kill")
+
+    ready = Nested(Readiness, default=None, description="Readiness probe that gates dependent programs")
+    liveness = Nested(Liveness, default=None, description="Liveness checks that restart a hung program")
+
+    replicas = Integer(val_min=1, default=1, description="Number of instances, named program-index and numbered in IGNITION_REPLICA")
+    quorum = Integer(val_min=0, default=0, description="Number of ready replicas that dependent programs wait for with parallel startup, 0 means all")
+    affinity = Affinity(default=None, description="CPU list, list of CPU lists for replicas or placement mode, core or numa")
+    limits = Nested(Limits, default=None, description="Scheduling priorities and resource limits")
 
     auxiliary = Unclaimed(description="Remaining arguments, enables plugin configuration")
 
-    def __init__(self, *args, _identifier: str = None, **kwargs):
+    def __init__(self, *args, _identifier: str = None, _replica: int = None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.thread = threading.Thread(target=self.run)
-        self.thread.daemon = True
+        self.thread = None
+        self.supervisor = None
         self.identifier = _identifier
+        self.replica = _replica
+        self.cpus = resolve_affinity(self.affinity, _replica or 0)
         self.running = False
         self.process = None
 
+        # Effective settings as they were read, set by the group and used to detect changes on reload
+        self.fingerprint = None
+
         self._user_id = get_userid(self.user)
         self._group_id = get_groupid(self.group)
         self.color = next(_COLOR_POOL)
         self.observers = []
         self.attempts = 0
         self.logfile = None
+        self._environment = None
+        self._layer = None
+        self._arguments = None
+        self._base = None
+        self._cgroup = None
+        self._pgid = None
+        self._setup = None
+        self._hung = False
+        self._announced = 0
+        # Log offset at which the current attempt started and announcements written since then,
+        # used to read output of the attempt when it is written to the log directly
+        self._offset = 0
+        self._notices = []
+        self._buffer = LineBuffer(self.maxline, self.truncate)
+        self._history = RingBuffer(self.history)
+        self._channel = None
+        self._lock = threading.Lock()
+        self._matched = threading.Event()
+        self._ready = threading.Event()
+        self._finished = threading.Event()
+        # No run is in progress until the program is started
+        self._finished.set()
+        self._wakeup = threading.Event()
+        self._started = None
+        self._crashes = 0
+        self.failed = False
+        self.output_lines = 0
+        self.output_bytes = 0
+        self.listeners = []
 
     def observe(self, observer):
         self.observers.append(observer)
 
+    def listen(self, listener):
+        """Registers a callable that receives lists of output lines, it is called from the output path
+        and must not block."""
+        self.listeners = self.listeners + [listener]
+
+    def unlisten(self, listener):
+        self.listeners = [x for x in self.listeners if x is not listener]
+
     def start(self):
+        """Starts a run of the program, returns False if the previous run has not finished yet."""
         if self.running:
-            return
-        self.thread.start()
-
-    def run(self):
+            return True
+        # The previous run still owns the process and its state until the run loop finishes
+        if not self._finished.wait(_REAP_TIMEOUT):
+            self.announce("Previous run has not finished, not starting.")
+            return False
         self.running = True
+        self.failed = False
+        self._hung = False
+        self._crashes = 0
+        self._finished.clear()
+        self._wakeup.clear()
+        self._ready.clear()
+        self._matched.clear()
+        self._prepare()
+        if self.supervisor is None:
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+        else:
+            self.supervisor.add(self)
+        return True
 
+    def _prepare(self):
         if not self.log is None:
             os.makedirs(os.path.dirname(self.log), exist_ok=True)
 
-        environment = os.environ.copy()
-        environment.update(self.environment)
+        # Programs of a group get their layer from the group, resolved when the group is read
+        if self._layer is None:
+            self._layer = Environment(self.environment, system_environment())
+        self._environment = self._layer
+
+        if self.limits is not None:
+            if self.limits.cgroup and self._cgroup is None:
+                tree = cgroup_tree()
+                try:
+                    if tree is None:
+                        raise OSError("delegated cgroup v2 subtree not available")
+                    self._cgroup = tree.create(self.identifier, self.limits)
+                except OSError as e:
+                    self.announce("Warning: memory and CPU limits not applied, %s" % e)
+            self._setup = self.limits.preexec(self._cgroup)
+
+        if self.logfile is not None:
+            return
 
-        environment = {k: expandvars(v) for k, v in environment.items()}
+        if self.log is None:
+            return
 
-        if self.logappend:
-            self.logfile = open(self.log, 'w') if not self.log is None else None
-        else:
-            self.logfile = open(self.log, 'a') if not self.log is None else None
-            if not self.logfile is None:
-                self.logfile.write("\n----- Starting log at %s ------\n\n" % datetime.datetime.now())
+        self.logfile = LogFile(self.log, self.logappend, self.rotate, self._structured)
+        if self.logappend and not self._structured:
+            self.logfile.write(("\n----- Starting log at %s ------\n\n" % datetime.datetime.now()).encode("utf-8"))
+            self.logfile.flush()
 
-        while self.running:
-            returncode = None
-            try:
-                self.attempts = self.attempts + 1
-                self.announce("Starting program (attempt %d)" % self.attempts)
+    @property
+    def _structured(self):
+        return self.logformat == "json" and self.log is not None
+
+    def _direct(self):
+        # Output is only needed in the supervisor for console and output readiness probe, a rotated
+        # log has to be written by the supervisor so that the file can be replaced
+        return self.direct and self.log is not None and not self.console and self.rotate is None and \
+            not self._structured and (self.ready is None or self.ready.output is None)
+
+    def reopen_log(self):
+        """Reopens the log file after it was moved by an external tool. A program that writes to the
+        log directly keeps its descriptor, announcements stay in the same file as its output."""
+        if self.logfile is None:
+            return
+        if self._direct():
+            self.announce("Warning: output is written to the log directly, the log is not reopened, "
+                "truncate it in place or disable direct")
+            return
+        with self._lock:
+            self.logfile.reopen()
 
-                full_command = shlex.split(expandvars(self.command, additional=environment))
-                full_directory = expandvars(self.directory if self.directory is not None else os.curdir, additional=environment)
+    def _spawn(self):
+        """Starts a new attempt, returns False if the process could not be created."""
+        self.attempts = self.attempts + 1
+        self.announce("Starting program (attempt %d)" % self.attempts)
+        tracer().event("spawn", "lifecycle", self.identifier, attempt=self.attempts)
 
-                if self.console and is_linux():
-                    full_command.insert(0, 'stdbuf')
-                    full_command.insert(1, '-oL')
+        # Recent output belongs to the current attempt, the previous one was already reported on exit
+        with self._lock:
+            self._history.clear()
 
-                preexec_fn = prepare_and_demote(self._user_id[0], self._group_id[0], self._group_id[2])
+        environment = self._environment
 
+        try:
+            full_command = shlex.split(expandvars(self.command, additional=environment))
+            full_directory = expandvars(self.directory if self.directory is not None else os.curdir, additional=environment)
+
+            if self.console and is_linux():
+                full_command.insert(0, 'stdbuf')
+                full_command.insert(1, '-oL')
+
+            arguments = spawn_arguments(self._user_id[0], self._group_id[0], self._group_id[2], cpus=self.cpus, setup=self._setup)
+
+            if self._direct():
+                # The child gets its own append-only descriptor, so its output never passes through
+                # the supervisor and announcements are still appended at the end of the file
+                output = os.open(self.log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                with self._lock:
+                    self._offset = os.fstat(output).st_size
+                    self._notices = []
+            else:
+                output = subprocess.PIPE
+
+            try:
                 self.process = subprocess.Popen(full_command, shell=False,
-                                                bufsize=0, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                                env=environment, cwd=full_directory, preexec_fn=preexec_fn)
-
-                self.announce("PID = %d" % self.process.pid)
-
-                while True:
-                    logline = self.process.stdout.readline()
-                    if logline:
-                        logline = logline.decode("utf-8")
-                        if self.console:
-                            with _TERMINAL_LOCK:
-                                print_colored(
-                                    "[%s]: " % self.identifier.ljust(20, ' '), self.color)
-                                # new line is already present
-                                sys.stdout.write(logline)
-                        if not self.logfile is None:
-                            self.logfile.write(logline)
-                            self.logfile.flush()
-                    else:
-                        break
-
-                self.process.wait()
-
-                returncode = self.process.returncode
-            except OSError as err:
-                returncode = None
-                self.announce("Error: %s" % str(err))
-
-            if returncode != None:
-                if returncode < 0:
-                    self.announce("Program has stopped (signal %d)" % -returncode)
-                else:
-                    self.announce("Program has stopped (exit code %d)" % returncode)
+                                                bufsize=0, stdout=output, stderr=subprocess.STDOUT,
+                                                env=environment.flatten(), cwd=full_directory, **arguments)
+            finally:
+                if output is not subprocess.PIPE:
+                    os.close(output)
+        except (OSError, subprocess.SubprocessError) as err:
+            self.announce("Error: %s" % str(err))
+            tracer().event("error", "lifecycle", self.identifier, error=str(err))
+            return False
+
+        self.announce("PID = %d" % self.process.pid)
+        # Children are process group leaders, the group outlives the leader if it leaves processes behind
+        self._pgid = self.process.pid
+        tracer().event("pid", "lifecycle", self.identifier, pid=self.process.pid)
+        if self.cpus is not None:
+            self.announce("Pinned to CPUs %s" % format_cpus(self.cpus))
+        if self.limits is not None:
+            # Skipped cgroup limits were already reported when the program was set up
+            applied = self.limits.describe(self._cgroup is not None)
+            if applied:
+                self.announce("Limits: %s" % applied)
+        self._started = time.monotonic()
+
+        for observer in self.observers:
+            observer.on_start(self)
+
+        return True
+
+    def _output(self, data):
+        """Relays a chunk of program output to the log file as it is and to the console split into lines."""
+        self.output_bytes += len(data)
+        self.output_lines += data.count(b"\n")
+        structured = self._structured
+        with self._lock:
+            self._history.write(data)
+            if not self.logfile is None and not structured:
+                self.logfile.write(data)
+                self.logfile.flush()
+        if not self.console and not self.listeners and not structured and not self._matching():
+            return
+        lines = self._buffer.feed(data)
+        if lines:
+            self._lines(lines)
+
+    def _output_end(self):
+        lines = self._buffer.flush()
+        if lines and (self.console or self.listeners or self._matching() or self._structured):
+            self._lines(lines)
+
+    def _matching(self):
+        # Output is only matched until the output readiness probe succeeds
+        return self.ready is not None and self.ready.output is not None and not self._matched.is_set()
+
+    def _record(self, stream, messages):
+        """Writes messages to a structured log as JSON lines, one record per message."""
+        timestamp = time.time()
+        data = "".join(json.dumps(dict(time=timestamp, program=self.identifier, attempt=self.attempts,
+            stream=stream, message=message)) + "\n" for message in messages).encode("utf-8")
+        with self._lock:
+            self.logfile.write(data, timestamp)
+            self.logfile.flush()
+
+    def _lines(self, lines):
+        if self.logfile is not None and self._structured:
+            self._record("output", lines)
+        if self._matching():
+            if any(self.ready.match(line) for line in lines):
+                self._matched.set()
+        if self.console:
+            # The event loop must never wait for the console, full queues drop lines instead
+            self.channel.push(lines, block=self.supervisor is None)
+        for listener in self.listeners:
+            listener(lines)
+
+    def _exited(self, returncode):
+        """Handles the end of an attempt, returns delay in seconds before the program should be
+        restarted or None if it should not be restarted."""
+        uptime = time.monotonic() - self._started if self._started is not None else 0
+        self._started = None
+
+        if returncode != None:
+            if returncode < 0:
+                self.announce("Program has stopped (signal %d)" % -returncode)
             else:
-                self.announce("Execution stopped because of an error")
+                self.announce("Program has stopped (exit code %d)" % returncode)
+        else:
+            self.announce("Execution stopped because of an error")
+        tracer().event("exit", "lifecycle", self.identifier, returncode=returncode, uptime=uptime)
 
-            self.process = None
+        if self.running and returncode:
+            self._crashed(returncode)
 
-            if not self.running:
-                break
+        self.process = None
 
-            if self.restart is False:
-                break
+        # Once the group is empty its id can be reused by an unrelated group, it is only remembered
+        # while processes left behind by the program keep it alive
+        if self._pgid is not None and not _group_exists(self._pgid):
+            self._pgid = None
+
+        if not self.running:
+            return None
+
+        policy = self.restart
+        hung, self._hung = self._hung, False
+
+        # A hung program is restarted even without a restart policy
+        if not policy.enabled and not hung:
+            return None
+
+        if policy.attempts > 0 and policy.attempts <= self.attempts:
+            self.announce("Maximum numer of attempts reached, giving up.")
+            return None
+
+        if uptime >= policy.reset:
+            self._crashes = 0
+        self._crashes = self._crashes + 1
+
+        if policy.crashloop > 0 and self._crashes >= policy.crashloop:
+            self.announce("Crash loop detected (%d consecutive crashes), giving up." % self._crashes)
+            self.failed = True
+            return None
 
-            if not self.restart is True and self.restart == self.attempts:
-                self.announce("Maximum numer of attempts reached, giving up.")
+        delay = policy.backoff(self._crashes)
+        self.announce("Restarting program in %.1f s." % delay)
+        tracer().event("restart", "lifecycle", self.identifier, delay=delay)
+        return delay
+
+    def recent(self, count=None):
+        """Returns most recent output lines of the current attempt, output written to the log directly
+        is read from its end, without announcements."""
+        if self._direct():
+            with self._lock:
+                offset, notices = self._offset, list(self._notices)
+            try:
+                with open(self.log, "rb") as handle:
+                    size = handle.seek(0, os.SEEK_END)
+                    if size < offset:
+                        # Truncated in place, the attempt cannot be told apart any more
+                        offset, notices = 0, []
+                    start = max(offset, size - max(self.history, _CHUNK_SIZE))
+                    handle.seek(start)
+                    data = handle.read()
+            except OSError:
+                return []
+            chunks = []
+            position = start
+            for begin, end in notices:
+                if end <= position:
+                    continue
+                chunks.append(data[position - start:max(begin, position) - start])
+                position = end
+            chunks.append(data[position - start:])
+            return tail_lines(b"".join(chunks), count, start > offset)
+        with self._lock:
+            return self._history.lines(count)
+
+    def _crashed(self, returncode):
+        if self.crashfile is not None:
+            lines = self.recent()
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.crashfile)), exist_ok=True)
+                with open(self.crashfile, "a") as handle:
+                    handle.write("----- %s, attempt %d, %s at %s ------\n" % (self.identifier, self.attempts,
+                        "signal %d" % -returncode if returncode < 0 else "exit code %d" % returncode,
+                        datetime.datetime.now()))
+                    handle.write("\n".join(lines) + "\n")
+                self.announce("Recent output written to %s" % self.crashfile)
+            except OSError as e:
+                self.announce("Unable to write %s: %s" % (self.crashfile, e))
+        elif self.crashlines > 0 and not self.console:
+            # Console programs have already shown their output
+            lines = self.recent(self.crashlines)
+            if lines:
+                self.channel.message("Last %d lines of output:" % len(lines))
+                for line in lines:
+                    self.channel.message("| " + line)
+
+    def _finish(self):
+        self.running = False
+        # A cgroup that still has processes left behind is kept so that they are killed on stop
+        if self._cgroup is not None and CgroupTree.remove(self._cgroup):
+            self._cgroup = None
+        if self.logfile is not None:
+            self.logfile.flush()
+        self._finished.set()
+        for observer in self.observers:
+            observer.on_stop(self)
+
+    def run(self):
+        while self.running:
+            returncode = None
+            if self._spawn():
+                try:
+                    if self.process.stdout is not None:
+                        stream = self.process.stdout.fileno()
+                        while True:
+                            data = os.read(stream, _CHUNK_SIZE)
+                            if not data:
+                                break
+                            self._output(data)
+                        self._output_end()
+
+                    self.process.wait()
+
+                    returncode = self.process.returncode
+                except OSError as err:
+                    returncode = None
+                    self.announce("Error: %s" % str(err))
+
+            delay = self._exited(returncode)
+            if delay is None:
                 break
 
-            self.announce("Restarting program.")
-            time.sleep(1)
+            # Interrupted by stop so that pending restarts do not delay shutdown
+            self._wakeup.wait(delay)
+
+        self._finish()
+
+    def wait_ready(self):
+        """Blocks until the readiness probe succeeds, times out or the program stops. Returns True
+        if the program is ready, programs without a probe are ready as soon as they are started."""
+        if self.ready is None:
+            self._ready.set()
+        if self._ready.is_set():
+            return True
+
+        environment = self._environment
+        directory = expandvars(self.directory, additional=environment) if self.directory is not None else None
+        expand = lambda value: expandvars(value, additional=environment)
+        variables = environment.flatten()
+
+        started = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - started
+            if (self.ready.output is None or self._matched.is_set()) and \
+                self.ready.check(expand, variables, directory):
+                self._ready.set()
+                self.announce("Ready after %.2f s (%s)" % (elapsed, self.ready.describe()))
+                tracer().event("ready", "lifecycle", self.identifier, elapsed=elapsed)
+                return True
+            if elapsed > self.ready.timeout:
+                self.announce("Not ready after %.2f s (%s)" % (elapsed, self.ready.describe()))
+                return False
+            if self._finished.is_set():
+                self.announce("Program stopped before it became ready (%s)" % self.ready.describe())
+                return False
+            if self.ready.output is not None and not self._matched.is_set():
+                self._matched.wait(self.ready.interval)
+            else:
+                time.sleep(self.ready.interval)
+
+    @property
+    def channel(self):
+        if self._channel is None:
+            self._channel = output_writer().channel("[%s]: " % self.identifier.ljust(20, ' '), self.color)
+        return self._channel
 
     def announce(self, message):
-        with _TERMINAL_LOCK:
-            print_colored("[%s]: " % self.identifier.ljust(20, ' '), self.color)
-            print(message)
-            if hasattr(self, "logfile") and not self.logfile is None:
-                self.logfile.write(message)
-                self.logfile.write("\n")
+        self.channel.message(message)
+        if hasattr(self, "logfile") and not self.logfile is None:
+            if self._structured:
+                self._record("ignition", [message])
+                return
+            data = (message + "\n").encode("utf-8")
+            with self._lock:
+                self.logfile.write(data)
+                self.logfile.flush()
+                self._announced += len(data)
+                if self._direct():
+                    end = self.logfile.tell()
+                    self._notices.append((end - len(data), end))
+
+    def interrupt(self):
+        """Prevents further restarts and sends the configured stop signal to the program. Returns
+        immediately, use wait_stopped to wait for the program to terminate."""
+        if not self.running:
+            return
+        self.running = False
+        self._cancel_restart()
+        tracer().event("stop", "lifecycle", self.identifier)
+        try:
+            if self.process:
+                self.announce("Stopping program.")
+                self.process.send_signal(self.signal)
+                #self.process.terminate()  # send_signal(signal.CTRL_C_EVENT)
+        except OSError:
+            pass
 
-    def stop(self, force=False):
-        if self.running and not force:
+    def wait_stopped(self, timeout=None):
+        """Waits for the program to terminate, returns False on timeout."""
+        if self.attempts == 0 and not self.running:
+            return True
+        return self._finished.wait(timeout)
+
+    def _cancel_restart(self):
+        self._wakeup.set()
+        if self.supervisor is not None:
+            self.supervisor.wake(self)
+
+    def kill(self):
+        """Kills the process group of the program."""
+        if self.running:
             self.running = False
+            self._cancel_restart()
+        process = self.process
+        if process is None or process.returncode is not None:
+            # The leader has exited, processes that it left behind in its group are killed
+            self._kill_group()
+            return
+        self.announce("Escalating, killing program.")
+        tracer().event("kill", "lifecycle", self.identifier)
+        self._kill_process(process)
+
+    def _kill_group(self):
+        pgid, self._pgid = self._pgid, None
+        if self._cgroup is not None:
+            CgroupTree.kill(self._cgroup)
+        if pgid is None:
+            return
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except OSError:
+            # Includes ProcessLookupError, the group is already empty
+            pass
+
+    def _kill_process(self, process):
+        if self._cgroup is not None:
+            # Also catches processes that left the process group
+            CgroupTree.kill(self._cgroup)
+        try:
+            # Children are process group leaders, this also kills anything they have spawned
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
             try:
-                if self.process:
-                    self.announce("Stopping program.")
-                    self.process.send_signal(self.signal)
-                    #self.process.terminate()  # send_signal(signal.CTRL_C_EVENT)
+                process.kill()
             except OSError:
                 pass
-            self.thread.join(5)
+
+    def recycle(self):
+        """Sends the configured stop signal to the current attempt of a hung program so that it is
+        restarted, returns False if the program has no running process."""
+        process = self.process
+        if not self.running or process is None:
+            return False
+        self._hung = True
+        self.announce("Restarting hung program.")
+        tracer().event("hung", "lifecycle", self.identifier)
         try:
-            if self.process:
-                self.announce("Escalating, killing program.")
-                self.process.kill()
+            process.send_signal(self.signal)
         except OSError:
             pass
+        return True
+
+    def stop(self, force=False):
+        if not force:
+            self.interrupt()
+            self.wait_stopped(self.grace)
+        self.kill()
+        self.wait_stopped(_REAP_TIMEOUT)
 
     def valid(self):
-        # Is valid if it is running or it was not even executed
-        return self.running or self.attempts == 0
+        # Is valid if it is running or it was not even executed, a crash loop is never valid
+        return not self.failed and (self.running or self.attempts == 0)
+
+    @property
+    def state(self):
+        if self.failed:
+            return "failed"
+        if not self.running:
+            return "stopped" if self.attempts > 0 else "pending"
+        if self.process is None:
+            return "restarting" if self.attempts > 0 else "starting"
+        return "running"
+
+    def status(self):
+        process = self.process
+        started = self._started
+        return dict(program=self.identifier, state=self.state, pid=process.pid if process is not None else None,
+            attempts=self.attempts, uptime=time.monotonic() - started if started is not None else None,
+            ready=self.running and self._ready.is_set(), required=self.required,
+            cpus=format_cpus(self.cpus) if self.cpus is not None else None,
+            limits=self.limits.describe(self._cgroup is not None) if self.limits is not None else None)
+
+    def replicate(self):
+        """Returns programs that this description expands to, the program itself if it is not replicated."""
+        if self.replicas == 1 or self._arguments is None:
+            return [self]
+        return [create_program(type(self), "%s-%d" % (self.identifier, i), self._arguments, self._base, i)
+            for i in range(self.replicas)]
+
+def _group_exists(pgid):
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+def create_program(cls, identifier, arguments, base, replica=None):
+    """Creates a program from its settings with environment layered on a base environment."""
+    kwargs = dict(arguments)
+    variables = kwargs.get("environment", {})
+    if replica is not None:
+        variables = dict(IGNITION_REPLICA=str(replica), IGNITION_REPLICAS=str(kwargs["replicas"]), **variables)
+        if kwargs.get("log") is not None:
+            root, ext = os.path.splitext(kwargs["log"])
+            kwargs["log"] = "%s-%d%s" % (root, replica, ext)
+    layer = Environment(variables, base)
+    kwargs["environment"] = layer.declared(system_environment())
+    program = cls(**kwargs, _identifier=identifier, _replica=replica)
+    program.fingerprint = json.dumps(kwargs, sort_keys=True, default=str)
+    program._layer = layer
+    program._arguments = arguments
+    program._base = base
+    return program
+
+class Inclusion(object):
+    """Programs of an included launch file instantiated for an include site, with members of every
+    include site, including nested ones, that dependencies on a site name refer to."""
+
+    def __init__(self):
+        self.programs = []
+        self.sites = {}
+
+def include_programs(group, site, arguments, source, base, scope, namespace="", requires=(), stack=()):
+    """Instantiates programs of a launch file included at a site. Identifiers of programs are prefixed
+    with the site name, dependencies among them are renamed accordingly, other dependencies refer to
+    the including file. Environment of the site is layered on the environment of the included file,
+    which is layered on the base environment. User, group and log directory of the site or of the
+    including scope override those of the included file. Other group settings of the included file
+    are ignored."""
+    path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(source)), expandvars(arguments["include"])))
+    if path in stack:
+        raise ValueError("Launch file %s includes itself" % path)
+    try:
+        data, digest, cached = include_cache().load(path)
+    except (OSError, ValueError) as e:
+        raise ValueError("Unable to load included launch file %s: %s" % (path, e))
+    if not isinstance(data, Mapping):
+        raise ValueError("Included launch file %s does not contain a mapping" % path)
+    if not cached:
+        group._uncached.append((digest, data))
+    if path not in group._sources:
+        group._sources.append(path)
+
+    prefix = namespace + site + "."
+    layer = Environment(arguments.get("environment") or {}, Environment(data.get("environment") or {}, base))
+    if arguments.get("log") is not None:
+        logs = arguments["log"]
+    elif scope.get("log") is not None:
+        logs = os.path.join(scope["log"], site)
+    else:
+        logs = data.get("log")
+    scope = dict(user=arguments.get("user", scope.get("user") or data.get("user")),
+        group=arguments.get("group", scope.get("group") or data.get("group")), log=logs)
+    requires = list(requires) + [namespace + d for d in arguments.get("depends", [])]
+
+    programs = data.get("programs") or {}
+    result = Inclusion()
+    members = set()
+    for name, value in programs.items():
+        kwargs = dict(value.items())
+        if "include" in kwargs:
+            nested = include_programs(group, name, kwargs, path, layer, scope, prefix, requires, stack + (path, ))
+            result.programs.extend(nested.programs)
+            result.sites.update(nested.sites)
+            members.update(nested.sites[prefix + name])
+            continue
+        kwargs["depends"] = [(prefix if d in programs else namespace) + d for d in kwargs.get("depends", [])] + requires
+        kwargs.setdefault("user", scope["user"])
+        kwargs.setdefault("group", scope["group"])
+        if logs is not None:
+            kwargs.setdefault("log", os.path.join(logs, "%s.log" % name))
+        result.programs.append(create_program(ProgramHandler, prefix + name, kwargs, layer))
+        members.add(prefix + name)
+    result.sites[namespace + site] = members
+    return result
 
 class ProgramDescription(Include):
 
@@ -278,31 +829,23 @@ class ProgramDescription(Include):
         if value is None:
             return None
         kwargs = dict(value.items())
-        kwargs.setdefault("user", context.parent.user)
-        kwargs.setdefault("group", context.parent.group)
-        if context.parent.log is not None:
-            kwargs.setdefault("log", os.path.join(context.parent.log, "%s.log" % context.key))
-
-        kwargs["environment"] = mergevars(context.parent.environment, kwargs.get("environment", {}))
+        group = context.parent
 
         if "include" in kwargs:
-            include = kwargs["include"]
-            root = os.path.dirname(context.parent.source)
-            try:
-                item = ProgramGroup.read(os.path.join(root, include), _parent=self, **kwargs)
-                item.depends = include.depends
-            except ValueError as e:
-                print("Error opening %s: %s" % (os.path.join(root, include), e))
-                raise ValueError("Unable to load included launch file")
-        #else:
-        #    kwargs.setdefault("logappend", context.parent.logappend)
+            return include_programs(group, context.key, kwargs, group.source, group.environment_layer(),
+                dict(user=group.user, group=group.group, log=group.log))
+
+        kwargs.setdefault("user", group.user)
+        kwargs.setdefault("group", group.group)
+        if group.log is not None:
+            kwargs.setdefault("log", os.path.join(group.log, "%s.log" % context.key))
 
-        return self._acls(**kwargs, _identifier=context.key)
+        return create_program(self._acls, context.key, kwargs, group.environment_layer())
 
     def dump(self, value: "Attributee"):
         return super().dump(value)
 
-class ProgramGroup(Attributee, Serializable):
+class ProgramGroup(Attributee, Serializable, ProgramObserver):
 
     title = String(default="")
     description = String(default="")
@@ -311,81 +854,448 @@ class ProgramGroup(Attributee, Serializable):
     group = String(default=None)
     environment = Map(String())
     plugins = List(String(), default=[])
+    parallel = Boolean(default=False, description="Start programs as soon as their dependencies are ready")
+    concurrency = Integer(val_min=0, default=0, description="Maximum number of programs started at once, 0 means no limit")
+    engine = Enumeration({"thread": "thread", "event": "event"}, default="thread",
+        description="Supervise programs with a thread per program or with a single event loop")
+    deadline = Float(val_min=0, default=30, description="Time in seconds after which all remaining programs are killed on stop")
+    output = Nested(OutputSettings, description="Console output buffering")
+    metrics = Nested(MetricsSettings, default=None, description="Resource metrics sampling and export")
+    control = String(default=None, description="Path of the control socket")
+    watch = Boolean(default=False, description="Reload the launch file when it changes")
+    trace = String(default=None, description="File that lifecycle events are written to on stop, in Chrome trace format if it ends with .json and as JSON lines otherwise")
     programs = Map(ProgramDescription())
 
     def __init__(self, *args, _source: str = None, **kwargs):
+        # Included files are resolved relative to the source and recorded while programs are coerced
+        self._source = _source
+        self._sources = [_source] if _source is not None else []
+        self._uncached = []
         super().__init__(*args, **kwargs)
         self._programs = {}
-        self._source = _source
-
-        registry = plugin_registry()
+        self._changed = threading.Event()
+        self._supervisor = None
+        self._sampler = None
+        self._watchdog = None
+        self._control = None
+        self._control_lock = threading.Lock()
+        self._held = set()
+        self._replicas = {}
+        self._quorums = {}
+        self._includes = {}
+
+        output_writer().configure(self.output)
 
         def load_plugin(name):
-            if name in registry:
-                return registry[name]()
-            plugin_cls = import_class(name)
-            if issubclass(plugin_cls, Plugin):
-                return plugin_cls()
-        
+            with timings().measure("plugin %s" % name):
+                return find_plugin(name)()
+
         self._plugins = [load_plugin(x) for x in self.plugins]
+        self._hooks = HookDispatcher(self._plugins)
 
-        for identifier, item in self.programs.items():
+        items = []
+        for item in self.programs.values():
+            if isinstance(item, Inclusion):
+                self._includes.update(item.sites)
+                items.extend(item.programs)
+            else:
+                items.append(item)
+
+        for item in items:
             if getattr(item, "ignore", False):
                 continue
-            self._programs[identifier] = item
-            run_plugins(self._plugins, 'on_program_init', item)
-
-        run_plugins(self._plugins, 'on_group_init', self)
+            identifier = item.identifier
+            replicas = item.replicate()
+            if len(replicas) > 1 or replicas[0] is not item:
+                self._replicas[identifier] = set(x.identifier for x in replicas)
+                if item.quorum > 0:
+                    for replica in replicas:
+                        self._quorums[replica.identifier] = (self._replicas[identifier], item.quorum)
+            for program in replicas:
+                if program.identifier in self._programs:
+                    raise ValueError("Program %s defined more than once" % program.identifier)
+                self._programs[program.identifier] = program
+                program.observe(self)
+                self._hooks.dispatch('on_program_init', program)
+
+        self._hooks.dispatch('on_group_init', self)
 
         graph = {}
         for i, program in self._programs.items():
             dependencies = set()
             for d in program.depends:
+                # Dependency on an include site is a dependency on all programs included there
+                if d in self._includes:
+                    for member in self._includes[d]:
+                        dependencies.update(self._replicas.get(member, {member} & self._programs.keys()))
+                    continue
+                # Dependency on a replicated program is a dependency on all of its replicas
+                if d in self._replicas:
+                    dependencies.update(self._replicas[d])
+                    continue
                 if not d in self._programs:
                     raise ValueError("Dependency %s not defined" % d)
                 dependencies.add(d)
             graph[i] = dependencies
 
-        blocks = toposort(graph)
+        blocks = [sorted(block) for block in toposort(graph)]
         sequence = []
         for block in blocks:
-            sequence.extend(list(block))
+            sequence.extend(block)
 
+        self.startup_blocks = blocks
         self.startup_sequence = sequence
+        self.dependencies = graph
+
+    def _start_program(self, identifier):
+        program = self._programs[identifier]
+        start = time.perf_counter()
+        # Span from the start hooks until the program is ready, used for critical path analysis
+        with tracer().span("start", "lifecycle", identifier) as span:
+            self._hooks.dispatch('on_program_start', program)
+            ready = False
+            if program.start():
+                self._hooks.dispatch('on_program_started', program)
+                ready = program.wait_ready()
+            span["ready"] = ready
+        timings().record("start %s" % identifier, start)
+        return ready
+
+    def _blocked(self, item, failed):
+        """Returns a dependency of a program that did not become ready, replicas with a quorum only
+        block dependents once too few of them are left to reach it."""
+        for dependency in sorted(self.dependencies[item] & failed):
+            replicas, quorum = self._quorums.get(dependency, (None, 0))
+            if quorum == 0 or len(replicas - failed) < quorum:
+                return dependency
+        return None
+
+    def _hold(self, item, dependency, failed):
+        self.announce("Not starting %s, dependency %s is not ready" % (item, dependency))
+        failed.add(item)
+
+    def _start_programs(self, items):
+        if self.parallel:
+            self._start_parallel(items)
+        else:
+            failed = set()
+            for item in items:
+                dependency = self._blocked(item, failed)
+                if dependency is not None:
+                    self._hold(item, dependency, failed)
+                elif not self._start_program(item):
+                    failed.add(item)
+
+    def _start_parallel(self, items):
+        # A program is submitted as soon as all of its dependencies have started and are ready,
+        # so workers are never blocked waiting for other programs
+        workers = len(items) if self.concurrency == 0 else self.concurrency
+        remaining = {item: self.dependencies[item] & set(items) for item in items}
+        started = set()
+        failed = set()
+        pending = {}
+
+        def satisfied(dependency):
+            # Replicas with a quorum are satisfied once enough of their siblings are ready
+            replicas, quorum = self._quorums.get(dependency, (None, 0))
+            return quorum > 0 and len(replicas & started) >= quorum
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            while remaining or pending:
+                for item in [x for x in items if x in remaining and all(satisfied(d) for d in remaining[x])]:
+                    del remaining[item]
+                    pending[executor.submit(self._start_program, item)] = item
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    if not future.result():
+                        failed.add(item)
+                        continue
+                    started.add(item)
+                    for dependencies in remaining.values():
+                        dependencies.discard(item)
+                # Dependents of programs that did not become ready are held back, transitively
+                blocked = True
+                while blocked:
+                    blocked = False
+                    for item in [x for x in items if x in remaining]:
+                        dependency = self._blocked(item, failed)
+                        if dependency is not None:
+                            del remaining[item]
+                            self._hold(item, dependency, failed)
+                            blocked = True
 
     def start(self):
-        run_plugins(self._plugins, 'on_group_start', self)
-        for item in self.startup_sequence:
-            run_plugins(
-                self._plugins, 'on_program_start', self._programs[item])
-            self._programs[item].start()
-            run_plugins(
-                self._plugins, 'on_program_started', self._programs[item])
-        run_plugins(self._plugins, 'on_group_started', self)
+        if self.engine == "event" and self._supervisor is None:
+            self._supervisor = Supervisor()
+            for program in self._programs.values():
+                program.supervisor = self._supervisor
+        if self.metrics is not None and self._sampler is None:
+            self._sampler = MetricsSampler(self._programs.values(), self.metrics)
+            self._sampler.start()
+        if self.control is not None and self._control is None:
+            self._control = ControlServer(self, self.control)
+            self._control.start()
+        self._watch(self._programs.values())
+        tracer().event("group", "lifecycle", dependencies={k: sorted(v) for k, v in self.dependencies.items()})
+        with timings().measure("start group"):
+            self._hooks.dispatch('on_group_start', self)
+            self._start_programs(self.startup_sequence)
+            self._hooks.dispatch('on_group_started', self)
+
+    def _stop_programs(self, items, force=False):
+        deadline = time.monotonic() + self.deadline
+        for block in reversed(self.startup_blocks):
+            programs = [self._programs[item] for item in block if item in items]
+            if not programs:
+                continue
+            for program in programs:
+                self._hooks.dispatch('on_program_stop', program)
+            if force or time.monotonic() >= deadline:
+                for program in programs:
+                    program.kill()
+            else:
+                # All programs in a level are signalled at once, each one is killed when its own grace
+                # period or the global deadline expires, programs are visited in order of that time
+                signalled = time.monotonic()
+                for program in programs:
+                    program.interrupt()
+                escalation = lambda program: min(signalled + program.grace, deadline)
+                for program in sorted(programs, key=escalation):
+                    program.wait_stopped(max(0, escalation(program) - time.monotonic()))
+                    program.kill()
+            # Killed programs are reaped before hooks run and before they can be started again
+            reaped = time.monotonic() + _REAP_TIMEOUT
+            for program in programs:
+                program.wait_stopped(max(0, reaped - time.monotonic()))
+            with ThreadPoolExecutor(max_workers=len(programs)) as executor:
+                for future in [executor.submit(self._hooks.dispatch, 'on_program_stopped', program) for program in programs]:
+                    future.result()
+
+    def _watch(self, programs):
+        programs = [program for program in programs if program.liveness is not None]
+        if programs and self._watchdog is None:
+            self._watchdog = Watchdog()
+        for program in programs:
+            self._watchdog.watch(program)
 
     def stop(self, force=False):
-        run_plugins(self._plugins, 'on_group_stop', self)
+        if self._control is not None:
+            self._control.stop()
+            self._control = None
+        if self._watchdog is not None:
+            self._watchdog.stop()
+            self._watchdog = None
+        self._hooks.dispatch('on_group_stop', self)
+        self._stop_programs(self.startup_sequence, force)
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+        self._hooks.dispatch('on_group_stopped', self)
+        self._hooks.drain(self.deadline)
+        if self.trace is not None:
+            try:
+                tracer().export(self.trace)
+            except OSError as e:
+                self.announce("Unable to write trace %s: %s" % (self.trace, e))
+
+    def reload(self, group):
+        """Applies programs of another group, that was not started, to this group. Programs are matched by
+        identifier, only removed or changed programs and their dependents are stopped and only new, changed
+        and stopped dependents are started, unchanged programs keep running. Group settings other than
+        programs are not applied. Returns lists of stopped and started program identifiers."""
+        with self._control_lock:
+            current = self._programs
+            removed = [item for item in current if item not in group._programs]
+            changed = [item for item in current if item in group._programs and
+                current[item].fingerprint != group._programs[item].fingerprint]
+            affected = set(removed + changed)
+            for item in removed + changed:
+                affected.update(self.dependents(item))
+
+            stopped = [item for item in self.startup_sequence if item in affected and current[item].running]
+            self._stop_programs(stopped)
+
+            programs = {}
+            for identifier, program in group._programs.items():
+                if identifier in current and identifier not in changed:
+                    programs[identifier] = current[identifier]
+                    continue
+                program.observers.remove(group)
+                program.observe(self)
+                program.supervisor = self._supervisor
+                if identifier in current:
+                    program.color = current[identifier].color
+                programs[identifier] = program
+
+            self._programs = programs
+            self.dependencies = group.dependencies
+            self._replicas = group._replicas
+            self._quorums = group._quorums
+            self._includes = group._includes
+            self.startup_blocks = group.startup_blocks
+            self.startup_sequence = group.startup_sequence
+            self._sources = group._sources
+            self._held.intersection_update(programs.keys())
+            if self._sampler is not None:
+                self._sampler.update(programs.values())
+            if self._watchdog is not None:
+                for identifier, program in current.items():
+                    if programs.get(identifier) is not program:
+                        self._watchdog.unwatch(program)
+            self._watch(programs.values())
+
+            started = [item for item in self.startup_sequence if item not in self._held and
+                not programs[item].running and (item in affected or item not in current)]
+            self._start_programs(started)
+
+        return stopped, started
+
+    def program(self, identifier):
+        if not identifier in self._programs:
+            raise KeyError("Unknown program %s" % identifier)
+        return self._programs[identifier]
+
+    def status(self):
+        return [self._programs[item].status() for item in self.startup_sequence]
+
+    def dependents(self, identifier):
+        """Returns all programs that depend on a program directly or indirectly, in startup order."""
+        affected = set([identifier])
+        for item in self.startup_sequence:
+            if self.dependencies[item] & affected:
+                affected.add(item)
+        return [item for item in self.startup_sequence if item in affected and item != identifier]
+
+    def _requirements(self, identifier):
+        required = set(self.dependencies[identifier])
         for item in reversed(self.startup_sequence):
-            run_plugins(
-                self._plugins, 'on_program_stop', self._programs[item])
-            self._programs[item].stop(force)
-            run_plugins(
-                self._plugins, 'on_program_stopped', self._programs[item])
-        run_plugins(self._plugins, 'on_group_stopped', self)
+            if item in required:
+                required.update(self.dependencies[item])
+        return [item for item in self.startup_sequence if item in required]
+
+    def start_program(self, identifier, cascade=False):
+        """Starts a single stopped program, with cascade its stopped dependencies are started first.
+        Returns a list of messages for the caller."""
+        self.program(identifier)
+        messages = []
+        with self._control_lock:
+            missing = [item for item in self._requirements(identifier) if not self._programs[item].running]
+            if missing and not cascade:
+                messages.append("Dependencies not running: %s (use cascade to start them)" % ", ".join(missing))
+            for item in (missing if cascade else []) + [identifier]:
+                if self._programs[item].running:
+                    if item == identifier:
+                        messages.append("Program %s is already running" % item)
+                    continue
+                self._held.discard(item)
+                if self._start_program(item):
+                    messages.append("Started %s" % item)
+                else:
+                    messages.append("Started %s, but it did not become ready" % item)
+        return messages
+
+    def stop_program(self, identifier, cascade=False):
+        """Stops a single program, with cascade its running dependents are stopped first. Programs stopped
+        this way do not invalidate the group. Returns a list of messages for the caller."""
+        self.program(identifier)
+        messages = []
+        with self._control_lock:
+            running = [item for item in self.dependents(identifier) if self._programs[item].running]
+            if running and not cascade:
+                messages.append("Dependents still running: %s (use cascade to stop them)" % ", ".join(running))
+            for item in reversed([identifier] + (running if cascade else [])):
+                program = self._programs[item]
+                if not program.running:
+                    continue
+                self._held.add(item)
+                self._hooks.dispatch('on_program_stop', program)
+                program.stop()
+                self._hooks.dispatch('on_program_stopped', program)
+                messages.append("Stopped %s" % item)
+        return messages
+
+    def restart_program(self, identifier, cascade=False):
+        """Restarts a single program, with cascade its running dependents are restarted as well."""
+        self.program(identifier)
+        with self._control_lock:
+            running = [item for item in self.dependents(identifier) if self._programs[item].running]
+        messages = self.stop_program(identifier, cascade)
+        for item in [identifier] + (running if cascade else []):
+            messages.extend(self.start_program(item))
+        return messages
+
+    def on_start(self, program):
+        self._changed.set()
+
+    def on_stop(self, program):
+        self._changed.set()
+
+    def wait(self, timeout=None):
+        """Blocks until one of the programs is started or stopped or until timeout."""
+        self._changed.wait(timeout)
+        self._changed.clear()
 
     def valid(self):
         valid = 0
-        for program in self._programs.values():
-            if program.valid():
+        for identifier, program in self._programs.items():
+            if program.valid() or identifier in self._held:
                 valid = valid + 1
             elif getattr(program, "required", True):
                 return False
         return valid > 0
 
     def announce(self, message):
-        print_colored(message, RED, True)
-        print("")
+        output_writer().message(message, RED, True)
+
+    def plugin_statistics(self):
+        """Returns number of calls and cumulative time of plugin hooks, keyed by plugin name and hook."""
+        return self._hooks.statistics()
+
+    def reopen_logs(self):
+        for program in list(self._programs.values()):
+            program.reopen_log()
 
     @property
     def source(self):
         return self._source
+
+    def environment_layer(self):
+        """Returns resolved environment of the group that program environments are layered on."""
+        # Called while programs are coerced, before the rest of the constructor runs
+        layer = getattr(self, "_layer", None)
+        if layer is None:
+            layer = Environment(self.environment, system_environment())
+            self._layer = layer
+        return layer
+
+    @property
+    def sources(self):
+        """Paths of all files that the group was read from."""
+        return list(self._sources)
+
+    @classmethod
+    def read(cls, source: str, defaults=None):
+        """Reads a group from a launch file, parsed files are cached by their content."""
+        cache = launch_cache()
+        name = os.path.basename(source)
+        start, traced = time.perf_counter(), time.monotonic()
+        data, digest, cached = cache.load(source)
+        timings().record("parse %s%s" % (name, " (cached)" if cached else ""), start)
+        tracer().complete("parse", "config", traced, source=source, cached=cached)
+
+        if not isinstance(data, Mapping):
+            raise ValueError("Launch file %s does not contain a mapping" % source)
+        arguments = dict(data)
+        for k, v in (defaults or {}).items():
+            arguments.setdefault(k, v)
+
+        with timings().measure("build %s" % name), tracer().span("build", "config", source=source):
+            group = cls(**arguments, _source=source)
+        if not cached:
+            cache.store(digest, data)
+        for digest, data in group._uncached:
+            cache.store(digest, data)
+        return group
@@ -0,0 +1,341 @@
+
+import os
+import glob
+import platform
+import threading
+
+from attributee import Attribute, Attributee, AttributeException
+from attributee.primitives import Float, Integer
+
+def parse_cpus(value):
+    """Parses a CPU list in the kernel format, e.g. 0-3,8,10-11, into a set of CPU indices."""
+    cpus = set()
+    for part in str(value).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        try:
+            cpus.update(range(int(first), int(last or first) + 1))
+        except ValueError:
+            raise ValueError("Illegal CPU list: %s" % value)
+    return cpus
+
+def format_cpus(cpus):
+    """Formats a set of CPU indices as a CPU list in the kernel format."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(a) if a == b else "%d-%d" % (a, b) for a, b in ranges)
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return os.sched_getaffinity(0)
+    return set(range(os.cpu_count() or 1))
+
+def numa_nodes(root="/sys/devices/system/node"):
+    """Returns a list of CPU sets of NUMA nodes, limited to CPUs available to this process. A system
+    without NUMA information is a single node."""
+    available = available_cpus()
+    nodes = []
+    for path in sorted(glob.glob(os.path.join(root, "node[0-9]*")), key=lambda x: int(x.rsplit("node", 1)[1])):
+        try:
+            with open(os.path.join(path, "cpulist")) as handle:
+                cpus = parse_cpus(handle.read()) & available
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes.append(cpus)
+    return nodes or [set(available)]
+
+AFFINITY_MODES = ("core", "numa")
+
+def resolve_affinity(affinity, replica=0):
+    """Returns a set of CPUs for a replica of a program. Mode core pins every replica to its own core,
+    consecutive replicas are placed on different NUMA nodes, mode numa pins every replica to all
+    cores of a NUMA node. A list assigns CPU lists to replicas in a round-robin manner, CPUs that are
+    not available to this process are dropped."""
+    if affinity is None:
+        return None
+    if isinstance(affinity, list):
+        return _available(affinity[replica % len(affinity)])
+    if affinity == "numa":
+        nodes = numa_nodes()
+        return nodes[replica % len(nodes)]
+    if affinity == "core":
+        nodes = [sorted(node) for node in numa_nodes()]
+        # Interleave cores of nodes so that replicas are spread evenly across nodes
+        cores = [node[i] for i in range(max(len(node) for node in nodes)) for node in nodes if i < len(node)]
+        return {cores[replica % len(cores)]}
+    return _available(affinity)
+
+def _available(value):
+    cpus = parse_cpus(value) & available_cpus()
+    if not cpus:
+        raise ValueError("None of CPUs %s are available" % value)
+    return cpus
+
+class Affinity(Attribute):
+    """CPU affinity attribute accepts a CPU list, a list of CPU lists, one per replica, or a
+    placement mode, core or numa."""
+
+    def coerce(self, value, context=None):
+        if value is None:
+            return None
+        if isinstance(value, (list, tuple)):
+            if not value:
+                raise AttributeException("Empty list of CPU lists")
+            value = [str(x) for x in value]
+            for item in value:
+                self._validate(item)
+            return value
+        value = str(value)
+        if value in AFFINITY_MODES:
+            return value
+        self._validate(value)
+        return value
+
+    def _validate(self, value):
+        try:
+            if not parse_cpus(value):
+                raise ValueError("Empty CPU list")
+            _available(value)
+        except ValueError as e:
+            raise AttributeException(str(e))
+
+    def dump(self, value):
+        return value
+
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+def parse_size(value):
+    """Parses a size in bytes with an optional binary unit suffix, e.g. 512M."""
+    if isinstance(value, int):
+        return value
+    text = str(value).strip().lower()
+    text = text[:-2] if text.endswith("ib") else text.rstrip("b")
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS else ""
+    try:
+        return int(float(text[:len(text) - len(unit)]) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError("Illegal size: %s" % value)
+
+def format_size(value):
+    for unit in ("T", "G", "M", "K"):
+        if value >= _SIZE_UNITS[unit.lower()] and value % _SIZE_UNITS[unit.lower()] == 0:
+            return "%d%s" % (value // _SIZE_UNITS[unit.lower()], unit)
+    return str(value)
+
+class Size(Attribute):
+    """Size in bytes, accepts an integer or a number with a binary unit suffix, e.g. 512M."""
+
+    def coerce(self, value, context=None):
+        if value is None:
+            return None
+        try:
+            size = parse_size(value)
+        except ValueError as e:
+            raise AttributeException(str(e))
+        if size < 0:
+            raise AttributeException("Size must not be negative")
+        return size
+
+    def dump(self, value):
+        return value
+
+_IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+# Numbers of ioprio_set system call, there is no wrapper in Python or libc
+_IOPRIO_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314, "armv6l": 314,
+    "ppc64le": 273, "ppc64": 273, "s390x": 282, "riscv64": 30}
+
+class IOPriority(Attribute):
+    """I/O scheduling class with an optional level, e.g. idle, best-effort:7 or realtime:0."""
+
+    def coerce(self, value, context=None):
+        if value is None:
+            return None
+        name, _, level = str(value).partition(":")
+        if name not in _IOPRIO_CLASSES:
+            raise AttributeException("Unknown I/O scheduling class: %s" % name)
+        if level and (not level.isdigit() or int(level) > 7):
+            raise AttributeException("I/O priority level must be between 0 and 7")
+        return str(value)
+
+    def dump(self, value):
+        return value
+
+def _ioprio_setter():
+    number = _IOPRIO_SYSCALLS.get(platform.machine())
+    if number is None:
+        return None
+    import ctypes
+    syscall = ctypes.CDLL(None, use_errno=True).syscall
+    def ioprio_set(value):
+        # IOPRIO_WHO_PROCESS with pid 0 is the calling process
+        if syscall(number, 1, 0, value) != 0:
+            raise OSError(ctypes.get_errno(), "Unable to set I/O priority")
+    return ioprio_set
+
+class Limits(Attributee):
+    """Scheduling priorities and resource limits of a program. Memory and CPU limits require a
+    delegated cgroup v2 subtree, they are skipped with a warning if it is not available."""
+
+    nice = Integer(val_min=-20, val_max=19, default=None, description="Scheduling priority, from -20 (highest) to 19")
+    io = IOPriority(default=None, description="I/O scheduling class and level, e.g. best-effort:7 or idle")
+    address = Size(default=None, description="Maximum size of virtual memory (RLIMIT_AS)")
+    files = Integer(val_min=0, default=None, description="Maximum number of open files (RLIMIT_NOFILE)")
+    core = Size(default=None, description="Maximum size of core dumps (RLIMIT_CORE)")
+    memory = Size(default=None, description="Memory limit of the program cgroup (memory.max)")
+    cpu = Float(val_min=0.01, default=None, description="CPU bandwidth of the program cgroup in CPUs (cpu.max)")
+
+    def rlimits(self):
+        import resource
+        limits = [(resource.RLIMIT_AS, self.address), (resource.RLIMIT_NOFILE, self.files), (resource.RLIMIT_CORE, self.core)]
+        return [(limit, value) for limit, value in limits if value is not None]
+
+    @property
+    def cgroup(self):
+        """True if limits require a cgroup."""
+        return self.memory is not None or self.cpu is not None
+
+    def preexec(self, cgroup=None):
+        """Returns a function that applies the limits in a child process before exec. All values are
+        prepared in advance, the function only makes system calls."""
+        import resource
+        setrlimit = resource.setrlimit
+        rlimits = self.rlimits()
+        nice = self.nice
+        io = None
+        ioprio_set = None
+        if self.io is not None:
+            name, _, level = self.io.partition(":")
+            io = _IOPRIO_CLASSES[name] << 13 | int(level or 4)
+            ioprio_set = _ioprio_setter()
+        procs = os.path.join(cgroup, "cgroup.procs").encode("utf-8") if cgroup is not None else None
+
+        def apply():
+            if procs is not None:
+                # Writing 0 moves the writing process, done first so that limits cover exec too
+                handle = os.open(procs, os.O_WRONLY)
+                try:
+                    os.write(handle, b"0")
+                finally:
+                    os.close(handle)
+            if nice is not None:
+                os.setpriority(os.PRIO_PROCESS, 0, nice)
+            if ioprio_set is not None:
+                ioprio_set(io)
+            for limit, value in rlimits:
+                setrlimit(limit, (value, value))
+        return apply
+
+    def describe(self, cgroup=True):
+        """Returns a short description of the limits, cgroup limits are omitted if they are not applied."""
+        parts = []
+        if self.nice is not None:
+            parts.append("nice %d" % self.nice)
+        if self.io is not None:
+            parts.append("io %s" % self.io)
+        if self.address is not None:
+            parts.append("address %s" % format_size(self.address))
+        if self.files is not None:
+            parts.append("files %d" % self.files)
+        if self.core is not None:
+            parts.append("core %s" % format_size(self.core))
+        if cgroup and self.memory is not None:
+            parts.append("memory %s" % format_size(self.memory))
+        if cgroup and self.cpu is not None:
+            parts.append("cpu %g" % self.cpu)
+        return ", ".join(parts)
+
+_CPU_PERIOD = 100000
+
+class CgroupTree(object):
+    """Delegated cgroup v2 subtree in which programs get their own cgroups. Processes cannot live in a
+    cgroup that distributes resources to its children, so ignition first moves itself to a leaf."""
+
+    def __init__(self, root):
+        self.root = root
+        self._prepared = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def detect(mount="/sys/fs/cgroup"):
+        """Returns a tree for the cgroup of this process if it is a writable cgroup v2 subtree with
+        memory and cpu controllers available, None otherwise."""
+        try:
+            with open("/proc/self/cgroup") as handle:
+                lines = handle.read().splitlines()
+            path = [line[3:] for line in lines if line.startswith("0::")][0]
+            root = os.path.join(mount, path.lstrip("/"))
+            with open(os.path.join(root, "cgroup.controllers")) as handle:
+                controllers = handle.read().split()
+        except (OSError, IndexError):
+            return None
+        if "memory" not in controllers or "cpu" not in controllers:
+            return None
+        if not os.access(os.path.join(root, "cgroup.subtree_control"), os.W_OK) or not os.access(root, os.W_OK):
+            return None
+        return CgroupTree(root)
+
+    def _write(self, path, value):
+        with open(path, "w") as handle:
+            handle.write(value)
+
+    def _prepare(self):
+        with self._lock:
+            if self._prepared:
+                return
+            supervisor = os.path.join(self.root, "ignition")
+            os.makedirs(supervisor, exist_ok=True)
+            with open(os.path.join(self.root, "cgroup.procs")) as handle:
+                processes = handle.read().split()
+            for pid in processes:
+                try:
+                    self._write(os.path.join(supervisor, "cgroup.procs"), pid)
+                except OSError:
+                    pass
+            self._write(os.path.join(self.root, "cgroup.subtree_control"), "+memory +cpu")
+            self._prepared = True
+
+    def create(self, name, limits):
+        """Creates or updates a cgroup for a program, returns its path."""
+        self._prepare()
+        path = os.path.join(self.root, "program-" + name)
+        os.makedirs(path, exist_ok=True)
+        self._write(os.path.join(path, "memory.max"), str(limits.memory) if limits.memory is not None else "max")
+        self._write(os.path.join(path, "cpu.max"), "%d %d" % (int(limits.cpu * _CPU_PERIOD), _CPU_PERIOD)
+            if limits.cpu is not None else "max %d" % _CPU_PERIOD)
+        return path
+
+    @staticmethod
+    def kill(path):
+        """Kills all processes in a cgroup, returns False if not supported by the kernel."""
+        try:
+            with open(os.path.join(path, "cgroup.kill"), "w") as handle:
+                handle.write("1")
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def remove(path):
+        """Removes an empty cgroup, returns False if it could not be removed."""
+        try:
+            os.rmdir(path)
+            return True
+        except OSError:
+            return False
+
+_cgroups = None
+
+def cgroup_tree():
+    """Returns the delegated cgroup tree of this process or None if it is not available."""
+    global _cgroups
+    if _cgroups is None:
+        _cgroups = CgroupTree.detect() or False
+    return _cgroups or None
@@ -0,0 +1,54 @@
+
+import math
+import random
+
+from attributee import Attribute, Attributee, AttributeException
+from attributee.primitives import Boolean, Float, Integer, to_logical
+
+class RestartPolicy(Attributee):
+    """Restart policy of a program. Delays grow exponentially with consecutive failures, a run that
+    lasts at least reset seconds is considered stable and resets the delay. A run shorter than that
+    counts as a crash, too many consecutive crashes are a crash loop that marks the program as failed."""
+
+    enabled = Boolean(default=True, description="Restart the program when it stops")
+    attempts = Integer(val_min=0, default=0, description="Maximum number of attempts, 0 means no limit")
+    delay = Float(val_min=0, default=1, description="Delay in seconds before the first restart")
+    factor = Float(val_min=1, default=2, description="Multiplier of the delay for every consecutive crash")
+    maximum = Float(val_min=0, default=60, description="Maximum delay in seconds")
+    jitter = Float(val_min=0, val_max=1, default=0.1, description="Random relative variation of the delay")
+    reset = Float(val_min=0, default=30, description="Uptime in seconds after which a run is considered stable")
+    crashloop = Integer(val_min=0, default=0, description="Number of consecutive crashes that mark the program as failed, 0 disables detection")
+
+    def backoff(self, crashes):
+        """Returns the delay before the next attempt after a number of consecutive crashes."""
+        exponent = max(crashes - 1, 0)
+        if self.factor > 1 and self.delay > 0:
+            # Growth stops at the maximum, a larger exponent would only overflow
+            exponent = min(exponent, math.ceil(math.log(max(self.maximum, self.delay) / self.delay, self.factor)))
+        delay = min(self.delay * self.factor ** exponent, self.maximum) if self.delay > 0 else 0
+        if self.jitter > 0:
+            delay = delay * (1 + random.uniform(-self.jitter, self.jitter))
+        return max(delay, 0)
+
+class Restart(Attribute):
+    """Restart attribute accepts a boolean, a maximum number of attempts or a policy mapping."""
+
+    def coerce(self, value, context=None):
+        if value is None:
+            return RestartPolicy(enabled=False)
+        if isinstance(value, RestartPolicy):
+            return value
+        if isinstance(value, bool):
+            return RestartPolicy(enabled=value)
+        if isinstance(value, int):
+            return RestartPolicy(enabled=value > 0, attempts=value)
+        if isinstance(value, str):
+            if value.isdigit():
+                return self.coerce(int(value), context)
+            return RestartPolicy(enabled=to_logical(value))
+        if isinstance(value, dict) or hasattr(value, "items"):
+            return RestartPolicy(**dict(value.items()))
+        raise AttributeException("Unable to parse restart policy: {}".format(value))
+
+    def dump(self, value):
+        return value.dump()
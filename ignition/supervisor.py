@@ -0,0 +1,196 @@
+
+import os
+import heapq
+import itertools
+import selectors
+import threading
+import time
+import traceback
+from collections import deque
+
+class _Child(object):
+
+    def __init__(self, program):
+        self.program = program
+        self.process = program.process
+        self.stream = program.process.stdout.fileno() if program.process.stdout is not None else None
+        self.pidfd = None
+
+class _Timer(object):
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+class Supervisor(object):
+    """Event loop that runs in a single thread and multiplexes output pipes and exit notifications
+    of all programs assigned to it. Process exits are observed through pidfd where available, otherwise
+    the process is polled once its output pipe is closed.
+    """
+
+    def __init__(self, chunk=65536, poll=0.1):
+        self._chunk = chunk
+        self._poll_interval = poll
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+        self._calls = deque()
+        self._timers = []
+        self._restarts = {}
+        self._counter = itertools.count()
+        self._thread = threading.Thread(target=self._loop, name="supervisor")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def call(self, callback, *args):
+        """Runs callback in the loop thread, can be called from any thread."""
+        self._calls.append((callback, args))
+        try:
+            os.write(self._wakeup_write, b"\0")
+        except BlockingIOError:
+            pass
+
+    def schedule(self, delay, callback, *args):
+        """Runs callback in the loop thread after delay seconds, can be called from any thread. Returns
+        a timer object, setting its cancelled attribute prevents the callback."""
+        timer = _Timer(callback, args)
+        if threading.current_thread() is not self._thread:
+            self.call(self._push, time.monotonic() + delay, timer)
+        else:
+            self._push(time.monotonic() + delay, timer)
+        return timer
+
+    def _push(self, deadline, timer):
+        heapq.heappush(self._timers, (deadline, next(self._counter), timer))
+
+    def add(self, program):
+        self.call(self._launch, program)
+
+    def wake(self, program):
+        """Cancels a pending restart of a program so that a stopped program finishes immediately."""
+        self.call(self._wake, program)
+
+    def _wake(self, program):
+        timer = self._restarts.pop(program, None)
+        if timer is not None:
+            timer.cancelled = True
+            self._launch(program)
+
+    def _launch(self, program):
+        self._restarts.pop(program, None)
+        if not program.running:
+            program._finish()
+            return
+        if not program._spawn():
+            self._exited(program, None)
+            return
+
+        child = _Child(program)
+        if child.stream is not None:
+            os.set_blocking(child.stream, False)
+            self._selector.register(child.stream, selectors.EVENT_READ, lambda: self._read(child))
+
+        pidfd_open = getattr(os, "pidfd_open", None)
+        if pidfd_open is not None:
+            try:
+                child.pidfd = pidfd_open(child.process.pid)
+                self._selector.register(child.pidfd, selectors.EVENT_READ, lambda: self._reap(child))
+            except OSError:
+                child.pidfd = None
+
+        if child.pidfd is None and child.stream is None:
+            self._poll(child)
+
+    def _read(self, child):
+        if child.stream is None:
+            return
+        try:
+            data = os.read(child.stream, self._chunk)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if not data:
+            self._close(child)
+            if child.pidfd is None:
+                self._poll(child)
+            return
+
+        child.program._output(data)
+
+    def _close(self, child):
+        if child.stream is None:
+            return
+        child.program._output_end()
+        self._selector.unregister(child.stream)
+        child.process.stdout.close()
+        child.stream = None
+
+    def _reap(self, child):
+        # Drain whatever the process has written before it exited
+        while child.stream is not None:
+            try:
+                data = os.read(child.stream, self._chunk)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                break
+            child.program._output(data)
+        self._close(child)
+        self._selector.unregister(child.pidfd)
+        os.close(child.pidfd)
+        child.pidfd = None
+        self._exited(child.program, child.process.wait())
+
+    def _poll(self, child):
+        returncode = child.process.poll()
+        if returncode is None:
+            self.schedule(self._poll_interval, self._poll, child)
+        else:
+            self._exited(child.program, returncode)
+
+    def _exited(self, program, returncode):
+        delay = program._exited(returncode)
+        if delay is None:
+            program._finish()
+        else:
+            self._restarts[program] = self.schedule(delay, self._launch, program)
+
+    def _loop(self):
+        while True:
+            timeout = None
+            if self._timers:
+                timeout = max(0, self._timers[0][0] - time.monotonic())
+
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while os.read(self._wakeup_read, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._dispatch(key.data)
+
+            now = time.monotonic()
+            while self._timers and self._timers[0][0] <= now:
+                _, _, timer = heapq.heappop(self._timers)
+                if not timer.cancelled:
+                    self._dispatch(timer.callback, *timer.args)
+
+            while self._calls:
+                callback, args = self._calls.popleft()
+                self._dispatch(callback, *args)
+
+    def _dispatch(self, callback, *args):
+        # An error in a single callback must not bring down supervision of all programs
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
@@ -0,0 +1,42 @@
+
+import time
+import threading
+from contextlib import contextmanager
+
+class Timings(object):
+    """Records durations of named startup phases, reported with ignite --timings."""
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._phases = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, end=None):
+        end = time.perf_counter() if end is None else end
+        with self._lock:
+            self._phases.append((name, start - self._origin, end - start))
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def report(self):
+        """Returns report lines with phase name, offset from process start and duration in milliseconds."""
+        with self._lock:
+            phases = sorted(self._phases, key=lambda x: x[1])
+        lines = ["%-40s %10s %10s" % ("phase", "at [ms]", "took [ms]")]
+        for name, offset, duration in phases:
+            lines.append("%-40s %10.1f %10.1f" % (name, offset * 1000, duration * 1000))
+        return lines
+
+_timings = None
+
+def timings():
+    global _timings
+    if _timings is None:
+        _timings = Timings()
+    return _timings
@@ -0,0 +1,175 @@
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+class Tracer(object):
+    """Records lifecycle events of programs and plugin hooks with monotonic timestamps. Events are
+    kept in memory in a bounded buffer and exported when the group stops."""
+
+    def __init__(self, capacity=100000):
+        self._origin = time.monotonic()
+        self._events = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def event(self, name, category, program=None, **args):
+        """Records an instant event."""
+        self._record(dict(name=name, cat=category, ph="i", ts=time.monotonic() - self._origin,
+            program=program, args=args))
+
+    def complete(self, name, category, start, program=None, **args):
+        """Records an event that started at a monotonic time start and ends now."""
+        now = time.monotonic()
+        self._record(dict(name=name, cat=category, ph="X", ts=start - self._origin, dur=now - start,
+            program=program, args=args))
+
+    @contextmanager
+    def span(self, name, category, program=None, **args):
+        start = time.monotonic()
+        try:
+            yield args
+        finally:
+            self.complete(name, category, start, program, **args)
+
+    def _record(self, event):
+        with self._lock:
+            self._events.append(event)
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def export(self, path):
+        """Writes events to a file, in Chrome trace format if the file name ends with .json and as
+        JSON lines otherwise."""
+        events = self.events()
+        with open(path, "w") as handle:
+            if path.endswith(".json"):
+                json.dump(chrome(events), handle)
+            else:
+                for event in events:
+                    handle.write(json.dumps(event, default=str) + "\n")
+
+_tracer = None
+
+def tracer():
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+def chrome(events):
+    """Converts events to Chrome trace format, every program is shown as its own thread."""
+    pid = os.getpid()
+    threads = {None: 0}
+    result = [dict(name="thread_name", ph="M", pid=pid, tid=0, args=dict(name="ignition"))]
+    for event in events:
+        program = event.get("program")
+        if program not in threads:
+            threads[program] = len(threads)
+            result.append(dict(name="thread_name", ph="M", pid=pid, tid=threads[program], args=dict(name=program)))
+        converted = dict(name=event["name"], cat=event["cat"], ph=event["ph"], ts=event["ts"] * 1e6,
+            pid=pid, tid=threads[program], args=dict(event.get("args", {}), program=program))
+        if event["ph"] == "X":
+            converted["dur"] = event["dur"] * 1e6
+        elif event["ph"] == "i":
+            converted["s"] = "t"
+        result.append(converted)
+    return dict(traceEvents=result, displayTimeUnit="ms")
+
+def load(path):
+    """Reads events exported in either format."""
+    with open(path) as handle:
+        content = handle.read()
+    if content.lstrip().startswith("{\"traceEvents\"") or path.endswith(".json"):
+        events = []
+        for event in json.loads(content)["traceEvents"]:
+            if event["ph"] == "M":
+                continue
+            args = dict(event.get("args", {}))
+            program = args.pop("program", None)
+            converted = dict(name=event["name"], cat=event.get("cat"), ph=event["ph"], ts=event["ts"] / 1e6,
+                program=program, args=args)
+            if "dur" in event:
+                converted["dur"] = event["dur"] / 1e6
+            events.append(converted)
+        return events
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+def critical_path(events):
+    """Returns the chain of programs that determined the end of startup as a list of tuples of
+    program, start time, duration until ready and time waited after the previous program."""
+    dependencies = {}
+    spans = {}
+    for event in events:
+        if event["name"] == "group" and event["ph"] == "i":
+            dependencies = {k: set(v) for k, v in event["args"].get("dependencies", {}).items()}
+        elif event["name"] == "start" and event["ph"] == "X" and event["program"] not in spans:
+            spans[event["program"]] = (event["ts"], event["ts"] + event["dur"])
+    if not spans:
+        return []
+    program = max(spans, key=lambda x: spans[x][1])
+    chain = [program]
+    while True:
+        candidates = [x for x in dependencies.get(program, []) if x in spans]
+        if not candidates:
+            break
+        program = max(candidates, key=lambda x: spans[x][1])
+        chain.insert(0, program)
+    path = []
+    previous = None
+    for program in chain:
+        start, end = spans[program]
+        path.append((program, start, end - start, start - previous if previous is not None else start))
+        previous = end
+    return path
+
+def plugin_times(events):
+    """Returns total time spent in plugin hooks as a dictionary mapping plugin and hook to
+    a tuple of number of calls and total duration."""
+    times = {}
+    for event in events:
+        if event["cat"] == "plugin" and event["ph"] == "X":
+            key = (event["args"].get("plugin"), event["name"])
+            count, total = times.get(key, (0, 0))
+            times[key] = (count + 1, total + event["dur"])
+    return times
+
+def main(argv):
+    """Entry point of ignite trace, returns exit code."""
+    parser = argparse.ArgumentParser(prog="ignite trace", description="Analyze a lifecycle trace of an ignite run")
+    parser.add_argument("trace", help="Trace file, JSON lines or Chrome trace format")
+    parser.add_argument("--chrome", default=None, help="Convert the trace to Chrome trace format and write it to a file")
+    args = parser.parse_args(argv)
+
+    try:
+        events = load(args.trace)
+    except (OSError, ValueError, KeyError) as e:
+        print("Unable to read trace %s: %s" % (args.trace, e), file=sys.stderr)
+        return 1
+
+    if args.chrome is not None:
+        with open(args.chrome, "w") as handle:
+            json.dump(chrome(events), handle)
+
+    path = critical_path(events)
+    print("Critical path:")
+    print("%-30s %10s %10s %10s" % ("PROGRAM", "START [ms]", "TOOK [ms]", "WAIT [ms]"))
+    for program, start, duration, wait in path:
+        print("%-30s %10.1f %10.1f %10.1f" % (program, start * 1000, duration * 1000, wait * 1000))
+    if path:
+        print("Startup finished after %.1f ms" % ((path[-1][1] + path[-1][2]) * 1000))
+
+    times = plugin_times(events)
+    if times:
+        print()
+        print("Plugin hooks:")
+        print("%-20s %-20s %8s %10s" % ("PLUGIN", "HOOK", "CALLS", "TIME [ms]"))
+        for (plugin, hook), (count, total) in sorted(times.items(), key=lambda x: -x[1][1]):
+            print("%-20s %-20s %8d %10.1f" % (plugin, hook, count, total * 1000))
+    return 0
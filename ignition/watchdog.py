@@ -0,0 +1,212 @@
+
+import os
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .environment import expandvars
+from .metrics import sample_process_groups
+from .output import output_writer, RED
+from .probe import check_tcp, check_command
+
+class _State(object):
+
+    def __init__(self, program):
+        self.program = program
+        self.process = None
+        self.failures = {}
+        self.active = None
+        self.output = None
+        self.cpu = None
+        self.sampled = None
+        self.pending = 0
+        self.recycled = None
+        self.cancelled = False
+
+    def reset(self, process, now):
+        self.process = process
+        self.failures = {}
+        self.active = now
+        self.output = None
+        self.cpu = None
+        self.sampled = None
+
+class Watchdog(object):
+    """Runs liveness checks of all programs on a single scheduler thread. Output and CPU checks are
+    evaluated in the scheduler, CPU usage of all programs that are due is sampled in one pass over
+    proc filesystem. Connection and command checks block, they run on a small shared pool of workers.
+    A program that fails a check threshold times in a row is stopped with its signal, killed after
+    its grace period and restarted."""
+
+    def __init__(self, workers=4):
+        self._timers = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._states = {}
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="liveness")
+        self._thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+        self._thread.start()
+
+    def watch(self, program):
+        with self._condition:
+            if program in self._states:
+                return
+            state = _State(program)
+            self._states[program] = state
+        self._schedule(program.liveness.interval, self._check, state)
+
+    def unwatch(self, program):
+        with self._condition:
+            state = self._states.pop(program, None)
+            if state is not None:
+                state.cancelled = True
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._executor.shutdown(wait=False)
+
+    def _schedule(self, delay, callback, *args):
+        with self._condition:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._counter), callback, args))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = []
+                while self._timers and self._timers[0][0] <= now:
+                    due.append(heapq.heappop(self._timers))
+            checks = [args[0] for _, _, callback, args in due if callback == self._check]
+            samples = self._sample(checks)
+            for _, _, callback, args in due:
+                try:
+                    if callback == self._check:
+                        self._check(args[0], samples)
+                    else:
+                        callback(*args)
+                except Exception as e:
+                    output_writer().message("Liveness check error: %s" % e, RED)
+
+    def _sample(self, states):
+        groups = []
+        for state in states:
+            process = state.program.process
+            if not state.cancelled and state.program.liveness.cpu is not None and process is not None:
+                groups.append(process.pid)
+        return sample_process_groups(groups) if groups else {}
+
+    def _check(self, state, samples=None):
+        if state.cancelled:
+            return
+        program = state.program
+        liveness = program.liveness
+        process = program.process
+        now = time.monotonic()
+
+        if process is None or not program.running or process is state.recycled:
+            state.process = None
+            self._schedule(liveness.interval, self._check, state)
+            return
+        if process is not state.process:
+            # New attempt, checks begin after the initial delay
+            state.reset(process, now)
+            self._schedule(max(liveness.initial, 0.1), self._check, state)
+            return
+
+        output = self._output(program)
+        silent = output == state.output
+        state.output = output
+        if not silent:
+            state.active = now
+
+        if liveness.silence is not None:
+            self._result(state, "silence", now - state.active < liveness.silence,
+                "no output for %.0f s" % (now - state.active))
+
+        if liveness.cpu is not None:
+            sample = (samples or {}).get(process.pid)
+            if sample is not None and sample.processes > 0:
+                if state.cpu is not None and now > state.sampled:
+                    usage = (sample.cpu - state.cpu) / (now - state.sampled)
+                    self._result(state, "cpu", not silent or usage < liveness.cpu,
+                        "%.0f %% CPU without output" % (usage * 100))
+                state.cpu = sample.cpu
+                state.sampled = now
+
+        if state.pending == 0:
+            expand = lambda value: expandvars(value, additional=program._environment)
+            if liveness.tcp is not None:
+                self._submit(state, process, "tcp", check_tcp, expand(liveness.tcp), liveness.timeout)
+            if liveness.command is not None:
+                directory = expand(program.directory) if program.directory is not None else None
+                self._submit(state, process, "command", check_command, expand(liveness.command),
+                    program._environment.flatten(), directory, liveness.timeout)
+
+        self._schedule(liveness.interval, self._check, state)
+
+    def _output(self, program):
+        if program._direct():
+            # Output goes to the log file directly, its size without announcements tells if the
+            # program writes anything
+            try:
+                return os.stat(program.log).st_size - program._announced
+            except OSError:
+                return None
+        return program.output_bytes
+
+    def _submit(self, state, process, name, check, *args):
+        def done(future):
+            try:
+                success = future.result()
+            except Exception:
+                success = False
+            # State is only modified in the scheduler thread
+            self._schedule(0, self._completed, state, process, name, success)
+        state.pending += 1
+        try:
+            self._executor.submit(check, *args).add_done_callback(done)
+        except RuntimeError:
+            # Executor is shut down
+            state.pending -= 1
+
+    def _completed(self, state, process, name, success):
+        state.pending -= 1
+        if state.process is process:
+            self._result(state, name, success, "%s check failed" % name)
+
+    def _result(self, state, name, success, reason):
+        program = state.program
+        if state.cancelled or state.process is None or state.process is not program.process:
+            return
+        if success:
+            state.failures[name] = 0
+            return
+        failures = state.failures.get(name, 0) + 1
+        state.failures[name] = failures
+        program.announce("Liveness check failed, %s (%d of %d)" % (reason, failures, program.liveness.threshold))
+        if failures < program.liveness.threshold:
+            return
+        process = state.process
+        # Further results for this attempt are ignored, the next attempt starts with a clean state
+        state.process = None
+        state.recycled = process
+        if program.recycle():
+            self._schedule(program.grace, self._escalate, program, process)
+
+    def _escalate(self, program, process):
+        if program.process is process and process.returncode is None:
+            program.announce("Escalating, killing program.")
+            program._kill_process(process)